@@ -1,16 +1,28 @@
 import sys
 import time
-from datetime import datetime
+import bisect
+import contextlib
+import hashlib
+import hmac
+import itertools
+from datetime import datetime, timedelta
 import math
 import json
+import mmap
+import numpy as np
 import os
 import queue
 import random
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import string
+import struct
+import tempfile
 import threading
+import websocket
 from dotenv import load_dotenv
 from enum import Enum
+from multiprocessing import shared_memory
 from pybit.unified_trading import HTTP, WebSocket
 
 # Сумісні іконки для консолі:
@@ -20,6 +32,454 @@ from pybit.unified_trading import HTTP, WebSocket
 class GridType(Enum):
     LINEAR = 1
     FIBO = 2
+    GEOMETRIC = 3 # Рівні з кроком у відсотках
+    CUSTOM = 4 # Рівні з файлу
+
+# Перелік джерел ринкових даних
+class MarketFeed(Enum):
+    WEBSOCKET = 1 # Власне підключення до WebSocket біржі
+    SHARED = 2 # Спільний кільцевий буфер постачальника ринкових даних
+    RAW = 3 # Власне підключення до WebSocket біржі з легким декодуванням (без обробника pybit)
+
+# Перелік класів REST запитів у порядку пріоритету
+class RestPriority(Enum):
+    ORDER = 0 # Розміщення ордерів
+    FILL = 1 # Перевірка виконання ордерів
+    BALANCE = 2 # Баланс гаманця
+    HISTORY = 3 # Історія ордерів та довідкові дані
+
+# Сітка рівнів купівлі: рівні нескінченних сіток (лінійна, Фібоначчі, геометрична) обчислюються арифметично за номером рівня,
+# рівні сітки з файлу зберігаються у відсортованому масиві з пошуком бісекцією
+# Рівні та ціни задаються в тіках фіксованої точності цін, тож порівняння рівнів точні
+class Grid:
+    def __init__(self, grid_type, step, offset, step_percent=0.0, levels=None):
+        self.grid_type = grid_type
+        self.step = step
+        self.offset = offset
+        self.ratio = 1 + step_percent / 100
+        self.fixed = levels is not None
+        self.levels = sorted(set(levels)) if self.fixed else []
+
+        if grid_type in (GridType.LINEAR, GridType.FIBO) and step <= 0:
+            raise ValueError("Для лінійної сітки та сітки Фібоначчі LEVEL_STEP має бути більший за 0")
+        if grid_type == GridType.GEOMETRIC and (offset <= 0 or self.ratio <= 1):
+            raise ValueError("Для геометричної сітки LEVEL_OFFSET та LEVEL_STEP_PERCENT мають бути більші за 0")
+        if self.fixed and not self.levels:
+            raise ValueError("Список рівнів сітки порожній")
+
+    def value(self, number):
+        """
+        Рівень нескінченної сітки за його номером.
+        """
+        if self.grid_type == GridType.GEOMETRIC:
+            return round(self.offset * self.ratio ** number)
+        return self.offset + number * self.step
+
+    def number(self, price):
+        """
+        Номер найбільшого рівня нескінченної сітки, не вищого за ціну.
+        """
+        if self.grid_type != GridType.GEOMETRIC:
+            return (price - self.offset) // self.step
+        number = math.floor(math.log(price / self.offset) / math.log(self.ratio))
+        # Корекція похибки логарифма та округлення рівнів до тіків
+        while self.value(number + 1) <= price:
+            number += 1
+        while self.value(number) > price:
+            number -= 1
+        return number
+
+    def lower(self, price):
+        """
+        Найбільший рівень, не вищий за ціну.
+        :return: Рівень або None, якщо рівня немає
+        """
+        if not self.fixed:
+            return self.value(self.number(price))
+        i = bisect.bisect_right(self.levels, price)
+        return self.levels[i - 1] if i > 0 else None
+
+    def upper(self, price):
+        """
+        Найменший рівень, вищий за ціну.
+        :return: Рівень або None, якщо рівня немає
+        """
+        if not self.fixed:
+            return self.value(self.number(price) + 1)
+        i = bisect.bisect_right(self.levels, price)
+        return self.levels[i] if i < len(self.levels) else None
+
+    def nearest(self, price):
+        """
+        Найближчий до ціни рівень (рівень позиції).
+        """
+        if not self.fixed:
+            number = self.number(price)
+            below, above = self.value(number), self.value(number + 1)
+        else:
+            i = bisect.bisect_right(self.levels, price)
+            if i == 0:
+                return self.levels[0]
+            if i == len(self.levels):
+                return self.levels[-1]
+            below, above = self.levels[i - 1], self.levels[i]
+        return below if price - below < above - price else above
+
+    def shift(self, level, count):
+        """
+        Зсув рівня на задану кількість рівнів (від'ємна - вниз).
+        :return: Рівень або None, якщо рівня немає
+        """
+        if not self.fixed:
+            return self.value(self.number(level) + count)
+        i = bisect.bisect_left(self.levels, level) + count
+        return self.levels[i] if 0 <= i < len(self.levels) else None
+
+# Підготовлений ордер: тіло запиту та дані для підпису, сформовані до перетину рівня
+class ArmedOrder:
+    __slots__ = ("side", "qty", "link_id", "body", "suffix", "headers")
+
+    def __init__(self, side, qty, link_id, body, suffix, headers):
+        self.side = side
+        self.qty = qty
+        self.link_id = link_id
+        self.body = body
+        self.suffix = suffix
+        self.headers = headers
+
+# Активна позиція: компактний запис з ціною, кількістю та комісією в цілих значеннях фіксованої точності
+class Position:
+    __slots__ = ("order_id", "date", "side", "price", "qty", "fee")
+
+    def __init__(self, order_id, date, side, price, qty, fee):
+        self.order_id = order_id
+        self.date = date
+        self.side = side
+        self.price = price
+        self.qty = qty
+        self.fee = fee
+
+# Ордер з історії біржі: лише поля, потрібні для відновлення позицій (замість повної відповіді біржі)
+class HistoryOrder:
+    __slots__ = ("order_id", "link_id", "side", "created_time", "price", "qty", "fee")
+
+    def __init__(self, order_id, link_id, side, created_time, price, qty, fee):
+        self.order_id = order_id
+        self.link_id = link_id
+        self.side = side
+        self.created_time = created_time
+        self.price = price
+        self.qty = qty
+        self.fee = fee
+
+# Інтервал трасування (записується у файл трасування після завершення)
+class TraceSpan:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        trace_event(self.name, self.start, time.time_ns(), self.args)
+        return False
+
+# Кільцевий буфер тіків у спільній пам'яті (один записувач, багато читачів)
+# Заголовок: сигнатура, ємність, епоха (час запуску постачальника), номер останнього запису
+# Комірка: номер запису, час (мс), остання ціна, об'єм
+class TickRing:
+    HEADER = struct.Struct("<4sIQQ")
+    SLOT = struct.Struct("<Qqdd")
+    SEQ = struct.Struct("<Q")
+    EPOCH = struct.Struct("<Q")
+    EPOCH_OFFSET = 8 # Зміщення епохи в заголовку (після сигнатури та ємності)
+    MAGIC = b"GMT2" # Версія формату комірки (без bid та ask)
+
+    def __init__(self, shm, capacity, epoch, owner):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = capacity
+        self.epoch = epoch
+        self.owner = owner
+        self.seq = 0 # Номер останнього записаного (для записувача) або наступного очікуваного (для читача) тіку
+
+    @classmethod
+    def create(cls, name, capacity):
+        """
+        Створення кільцевого буфера (постачальник ринкових даних).
+        """
+        try:
+            # Видалення буфера, що лишився після аварійного завершення попереднього постачальника
+            # (читачі, підключені до нього, бачать закритий заголовок і перепідключаються до нового буфера)
+            stale = shared_memory.SharedMemory(name=name)
+            if stale.size >= cls.HEADER.size:
+                cls.EPOCH.pack_into(stale.buf, cls.EPOCH_OFFSET, 0)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.HEADER.size + capacity * cls.SLOT.size)
+        ring = cls(shm, capacity, time.time_ns(), owner=True)
+        cls.HEADER.pack_into(ring.buf, 0, cls.MAGIC, capacity, ring.epoch, 0)
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Підключення до існуючого кільцевого буфера (процес бота).
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13: буфер не має видалятись трекером ресурсів при завершенні читача
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+
+        magic, capacity, epoch, seq = cls.HEADER.unpack_from(shm.buf, 0)
+        if magic != cls.MAGIC:
+            shm.close()
+            raise ValueError(f"Невірний формат спільного буфера {name}")
+
+        ring = cls(shm, capacity, epoch, owner=False)
+        ring.seq = seq + 1 # Читання починається з наступного тіку
+        return ring
+
+    def publish(self, tick):
+        """
+        Запис тіку у буфер.
+        :param tick: Тік (час, остання ціна, об'єм)
+        """
+        self.seq += 1
+        offset = self.HEADER.size + (self.seq % self.capacity) * self.SLOT.size
+        self.SLOT.pack_into(self.buf, offset, 0, *tick) # Комірка в процесі запису
+        self.SEQ.pack_into(self.buf, offset, self.seq)
+        self.SEQ.pack_into(self.buf, self.HEADER.size - self.SEQ.size, self.seq)
+
+    def head(self):
+        """
+        Номер останнього записаного тіку.
+        """
+        return self.SEQ.unpack_from(self.buf, self.HEADER.size - self.SEQ.size)[0]
+
+    def is_stale(self):
+        """
+        Перевірка, чи буфер належить постачальнику, що вже завершив роботу або був перезапущений.
+        Постачальник обнуляє епоху в заголовку буфера перед його видаленням.
+        """
+        return self.EPOCH.unpack_from(self.buf, self.EPOCH_OFFSET)[0] != self.epoch
+
+    def read(self):
+        """
+        Читання наступного тіку.
+        :return: Кортеж (тік або None, кількість пропущених тіків)
+        """
+        head = self.head()
+        if head < self.seq:
+            return None, 0
+
+        # Читач відстав більше ніж на ємність буфера, переходимо до останнього тіку
+        missed = 0
+        if head - self.seq >= self.capacity:
+            missed = head - self.seq
+            self.seq = head
+
+        offset = self.HEADER.size + (self.seq % self.capacity) * self.SLOT.size
+        seq, *tick = self.SLOT.unpack_from(self.buf, offset)
+        if seq != self.seq or self.SEQ.unpack_from(self.buf, offset)[0] != seq:
+            # Комірку перезаписано під час читання, переходимо до останнього тіку
+            head = self.head()
+            missed += max(head - self.seq, 0)
+            self.seq = max(head, self.seq)
+            return None, missed
+
+        self.seq += 1
+        return tuple(tick), missed
+
+    def close(self):
+        """
+        Закриття буфера (постачальник також позначає його закритим для читачів і видаляє).
+        """
+        if self.owner:
+            self.EPOCH.pack_into(self.buf, self.EPOCH_OFFSET, 0)
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# Тіньові сітки: симуляція багатьох конфігурацій сітки на живому потоці тіків
+# Стан усіх конфігурацій зберігається в масивах NumPy (рядок - конфігурація, стовпець - позиція)
+# і оновлюється векторно на кожному тіку з тими ж правилами, що й жива сітка
+class ShadowGrids:
+    def __init__(self, configs, levels=None):
+        count = len(configs)
+        self.configs = configs
+        self.step = np.array([c['LEVEL_STEP'] for c in configs], dtype=float)
+        self.offset = np.array([c['LEVEL_OFFSET'] for c in configs], dtype=float)
+        self.ratio = np.array([1 + c['LEVEL_STEP_PERCENT'] / 100 for c in configs], dtype=float)
+        self.target = np.array([c['PROFIT_TARGET'] for c in configs], dtype=float)
+        self.fibo = np.array([c['GRID_TYPE'] == GridType.FIBO for c in configs], dtype=bool)
+        self.geometric = np.array([c['GRID_TYPE'] == GridType.GEOMETRIC for c in configs], dtype=bool)
+        self.custom = np.array([c['GRID_TYPE'] == GridType.CUSTOM for c in configs], dtype=bool)
+        self.levels = np.array(sorted(set(levels or [])), dtype=float) # Рівні сітки з файлу
+        self.prices = np.full((count, 16), np.nan) # Ціни купівлі позицій (NaN - вільна комірка)
+        self.numbers = np.full((count, 16), np.nan) # Номери рівнів позицій (NaN - вільна комірка)
+        self.qty = np.zeros((count, 16)) # Кількість базової монети позицій
+        self.realized = np.zeros(count) # Реалізований прибуток
+        self.buys = np.zeros(count, dtype=int) # Кількість купівель
+        self.sells = np.zeros(count, dtype=int) # Кількість продажів
+        self.last_price = 0.0
+
+        # Зсув рівня (у кроках) для сітки Фібоначчі залежно від кількості позицій
+        self.fibo_shift = np.zeros(FIBO_NUMBERS[-1] + 1, dtype=float)
+        for positions in range(len(self.fibo_shift)):
+            prev = FIBO_NUMBERS[0]
+            for curr in FIBO_NUMBERS:
+                if positions < curr:
+                    diff = curr - prev
+                    self.fibo_shift[positions] = diff if diff > 1 else 0
+                    break
+                prev = curr
+
+    def values(self, numbers):
+        """
+        Рівні сіток за номерами рівнів (аналог Grid.value), NaN - рівня немає.
+        """
+        with np.errstate(all="ignore"):
+            values = self.offset[:, None] + numbers * self.step[:, None]
+            if self.geometric.any():
+                values = np.where(self.geometric[:, None], self.offset[:, None] * self.ratio[:, None] ** numbers, values)
+            if self.custom.any():
+                valid = (numbers >= 0) & (numbers < len(self.levels))
+                index = np.where(valid, numbers, 0).astype(int)
+                values = np.where(self.custom[:, None], np.where(valid, self.levels[index], np.nan), values)
+        return values
+
+    def lower_numbers(self, prices):
+        """
+        Номери найбільших рівнів, не вищих за ціни (аналог Grid.lower), NaN - рівня немає.
+        """
+        with np.errstate(all="ignore"):
+            numbers = np.floor((prices - self.offset[:, None]) / self.step[:, None])
+            if self.geometric.any():
+                numbers = np.where(self.geometric[:, None], np.floor(np.log(prices / self.offset[:, None]) / np.log(self.ratio[:, None])), numbers)
+            # Уточнення номера для цін на межі рівня (похибка округлення формули)
+            numbers += self.values(numbers + 1) <= prices
+            numbers -= self.values(numbers) > prices
+            if self.custom.any():
+                numbers = np.where(self.custom[:, None], np.searchsorted(self.levels, prices, side="right") - 1.0, numbers)
+        return numbers
+
+    def nearest_numbers(self, prices):
+        """
+        Номери найближчих рівнів для цін позицій (аналог Grid.nearest).
+        """
+        numbers = self.lower_numbers(prices)
+        below = self.values(numbers)
+        above = self.values(numbers + 1)
+        with np.errstate(invalid="ignore"):
+            closer_above = (np.isnan(below) | ~(prices - below < above - prices)) & ~np.isnan(above)
+        return numbers + closer_above
+
+    def process(self, price):
+        """
+        Обробка тіку усіма конфігураціями.
+        :param price: Поточна ціна
+        """
+        last = self.last_price
+        if last <= 0:
+            self.last_price = price
+            return
+        if math.isclose(price, last):
+            return
+
+        prices = self.prices
+        held = ~np.isnan(prices)
+
+        # Продаж позицій, що досягли цільового прибутку
+        sell = held & (price >= prices + self.target[:, None])
+        if sell.any():
+            self.realized += np.where(sell, (price - prices) * self.qty, 0).sum(axis=1)
+            self.sells += sell.sum(axis=1)
+            prices[sell] = np.nan
+            self.numbers[sell] = np.nan
+            self.qty[sell] = 0
+            held &= ~sell
+
+        # Рівні сітки обчислюються в номерах рівнів, тож порівняння рівнів точні
+        count = held.sum(axis=1)
+        numbers = self.numbers
+        current = self.lower_numbers(np.full((len(self.configs), 1), last))[:, 0]
+
+        # Наступний нижній рівень купівлі (аналог get_next_lower_buy_level)
+        min_number = np.where(held, numbers, np.inf).min(axis=1)
+        shift = self.fibo_shift[np.minimum(count, len(self.fibo_shift) - 1)]
+        lower = np.where(self.fibo & (count > 0) & (shift > 0) & ~np.isnan(current), min_number - shift, current)
+        lower -= (numbers == lower[:, None]).any(axis=1)
+
+        # Наступний верхній рівень купівлі (аналог get_next_upper_buy_level)
+        upper = np.where(count > 0, np.where(held, numbers, -np.inf).max(axis=1), current) + 1
+
+        # Купівля при перетині рівня, якщо на ньому немає позиції (аналог check_and_execute_buy)
+        lower_level = self.values(lower[:, None])[:, 0]
+        upper_level = self.values(upper[:, None])[:, 0]
+        down = (last > lower_level) & (price <= lower_level)
+        up = ~down & (last < upper_level) & (price >= upper_level)
+        level = np.where(down, lower, upper)
+        buy = (down | up) & ~(numbers == level[:, None]).any(axis=1)
+        if buy.any():
+            rows = np.nonzero(buy)[0]
+            if (count[rows] >= prices.shape[1]).any():
+                self.grow()
+                prices = self.prices
+            slots = np.isnan(prices[rows]).argmax(axis=1)
+            prices[rows, slots] = price
+            self.numbers[rows, slots] = self.nearest_numbers(np.full((len(self.configs), 1), price))[rows, 0]
+            self.qty[rows, slots] = ORDER_SIZE / price
+            self.buys[rows] += 1
+
+        self.last_price = price
+
+    def grow(self):
+        """
+        Збільшення кількості комірок позицій удвічі.
+        """
+        count, size = self.prices.shape
+        self.prices = np.hstack([self.prices, np.full((count, size), np.nan)])
+        self.numbers = np.hstack([self.numbers, np.full((count, size), np.nan)])
+        self.qty = np.hstack([self.qty, np.zeros((count, size))])
+
+    def report(self, top=10):
+        """
+        Порівняльний звіт прибутковості конфігурацій.
+        :param top: Кількість найкращих конфігурацій у звіті
+        :return: Текст звіту
+        """
+        held = ~np.isnan(self.prices)
+        unrealized = np.where(held, (self.last_price - self.prices) * self.qty, 0).sum(axis=1)
+        pnl = self.realized + unrealized
+        order = np.argsort(-pnl, kind="stable")
+        live_rank = int(np.nonzero(order == 0)[0][0]) + 1
+
+        message = f"➗ Тіньові сітки ({len(self.configs)} шт), жива конфігурація на {live_rank} місці:"
+        for rank, i in enumerate(order[:top], start=1):
+            c = self.configs[i]
+            message += f"\n{rank}. {'(жива) ' if i == 0 else ''}{c['GRID_TYPE'].name}"
+            if c['GRID_TYPE'] == GridType.GEOMETRIC:
+                message += f" крок {c['LEVEL_STEP_PERCENT']:g}%, базовий рівень {c['LEVEL_OFFSET']:g}, ціль {c['PROFIT_TARGET']:g}:"
+            elif c['GRID_TYPE'] == GridType.CUSTOM:
+                message += f" рівні з файлу, ціль {c['PROFIT_TARGET']:g}:"
+            else:
+                message += f" крок {c['LEVEL_STEP']:g}, зміщення {c['LEVEL_OFFSET']:g}, ціль {c['PROFIT_TARGET']:g}:"
+            message += f" прибуток {pnl[i]:.2f} (реалізований {self.realized[i]:.2f}, нереалізований {unrealized[i]:.2f}),"
+            message += f" купівель {self.buys[i]}, продажів {self.sells[i]}, позицій {held[i].sum()}"
+        return message
 
 # Завантаження змінних оточення
 load_dotenv()
@@ -36,19 +496,62 @@ SYMBOL = os.getenv('SYMBOL', 'BTCUSDT').upper() # Торгова пара
 ORDER_SIZE = float(os.getenv('ORDER_SIZE', '10')) # Сума в котирувальній монеті для покупки
 PROFIT_TARGET = float(os.getenv('PROFIT_TARGET', '1000')) # Зміна ціни для продажу
 LEVEL_STEP = float(os.getenv('LEVEL_STEP', '1000')) # Крок рівня для купівлі
-LEVEL_OFFSET = float(os.getenv('LEVEL_OFFSET', '500')) # Зміщення рівня для купівлі
+LEVEL_OFFSET = float(os.getenv('LEVEL_OFFSET', '500')) # Зміщення рівня для купівлі (базовий рівень для геометричної сітки)
+LEVEL_STEP_PERCENT = float(os.getenv('LEVEL_STEP_PERCENT', '1')) # Крок рівня у відсотках для геометричної сітки
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'False').lower() in ('true', '1') # Увімкнення трасування обробки тіків
+MARKET_FEED = MarketFeed[os.getenv('MARKET_FEED', 'WEBSOCKET').upper()] # Джерело ринкових даних
+TICK_RECORDING = os.getenv('TICK_RECORDING', 'False').lower() in ('true', '1') # Увімкнення запису тіків у бінарні файли
+SHADOW_GRIDS = os.getenv('SHADOW_GRIDS', 'False').lower() in ('true', '1') # Увімкнення тіньових сіток
 
 # Статичні налаштування
-HISTORY_FILE = "history.json"
+EXECUTIONS_FILE = "executions.jsonl"
+HISTORY_FILE = "history.jsonl"
+LEGACY_HISTORY_FILE = "history.json" # Файл історії попереднього формату (перетворюється при першому запуску)
+LEDGER_FILE = "ledger.jsonl"
+LEVELS_FILE = "levels.json"
+LEDGER_STATS_FILE = "ledger_stats.json"
 POSITIONS_FILE = "positions.json"
+SHADOW_GRIDS_FILE = "shadow.json"
 STATS_LOG_FILE = "stats.log"
+TRACE_FILE = "trace.json"
+TICKS_DIR = "ticks"
 TRADE_LOG_FILE = "trade.log"
 WORK_LOG_FILE = "work.log"
 FIBO_NUMBERS = [1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144] # Послідовність Фіббоначі
+QTY_EXTRA_PRECISION = 2 # Додаткові знаки кількості позицій понад точність базової монети (кількість після вирахування комісії)
+RECV_WINDOW = 10000 # Вікно отримання запиту біржею (у мілісекундах)
 RETRY_COUNT = 10 # Кількість спроб
 RETRY_DELAY_SECONDS = 3 # Затримка між спробами (у секундах)
+EXECUTOR_WORKERS = 4 # Кількість потоків виконавця ордерів
+WORKER_POLL_INTERVAL_SECONDS = 1 # Інтервал перевірки сигналу зупинки робочим потоком, коли черга порожня
 TICKER_LOG_INTERVAL_MINS = 10 # Інтервал логування потоку тікерів
 STATS_LOG_INTERVAL_MINS = 60 * 24 # Інтервал логування статистики
+SHADOW_REPORT_INTERVAL_MINS = 60 # Інтервал звіту тіньових сіток
+LEDGER_CHECKPOINT_ENTRIES = 50 # Кількість записів журналу угод між збереженнями статистики
+LEDGER_KEEP_DAYS = 31 # Кількість днів, за які зберігається прибуток за днями
+LEDGER_KEEP_WEEKS = 9 # Кількість тижнів, за які зберігається прибуток за тижнями
+VOLATILITY_EWMA_ALPHA = 0.05 # Коефіцієнт згладжування волатильності (змін ціни між тіками)
+REST_RATE_LIMITS = { # Початковий бюджет запитів за секунду для кожного класу REST запитів
+    RestPriority.ORDER: 10,
+    RestPriority.FILL: 10,
+    RestPriority.BALANCE: 5,
+    RestPriority.HISTORY: 4
+}
+REST_LIMIT_USAGE = 0.8 # Частка ліміту біржі (з заголовків відповіді), що використовується бюджетом
+TICK_RECORD = struct.Struct("<qdd") # Запис тіку: час (мс), остання ціна, об'єм (стрім тікерів спотового ринку не містить bid та ask)
+FEED_RING_NAME = f"gridmaton_{SYMBOL.lower()}" # Назва спільного буфера тіків
+FEED_RING_CAPACITY = 4096 # Ємність спільного буфера тіків
+FEED_POLL_INTERVAL_SECONDS = 0.0002 # Інтервал опитування спільного буфера тіків
+FEED_STALE_SECONDS = 30 # Час без нових тіків, після якого виконується перепідключення до спільного буфера
+RAW_FEED_URL = "wss://stream.bybit.com/v5/public/spot" # Публічний WebSocket спотового ринку
+RAW_FEED_TIMEOUT_SECONDS = 1 # Час очікування повідомлення легким клієнтом WebSocket
+RAW_FEED_PING_SECONDS = 20 # Інтервал ping для утримання підключення легкого клієнта WebSocket
+SOAK_TICKS = 2000000 # Кількість тіків тривалої симуляції
+SOAK_CHECK_TICKS = 100000 # Інтервал перевірки пам'яті тривалої симуляції (у тіках)
+SOAK_RSS_GROWTH_MB = 8 # Допустиме зростання пам'яті тривалої симуляції після розігріву (у МБ)
+SOAK_START_PRICE = 60000 # Ціна, навколо якої коливається тривала симуляція (якщо не задано --price)
+SOAK_BAND_LEVELS = 10 # Діапазон коливання ціни тривалої симуляції (у кроках сітки від початкової ціни)
+SOAK_LEVEL_MOVES = 8 # Відношення кроку сітки до найбільшої зміни ціни за тік тривалої симуляції
 MS_IN_DAY = 24 * 60 * 60 * 1000
 MS_IN_7_DAYS = 7 * MS_IN_DAY
 
@@ -56,6 +559,9 @@ MS_IN_7_DAYS = 7 * MS_IN_DAY
 if not API_KEY or not API_SECRET:
     raise ValueError("Ключі API_KEY та API_SECRET мають бути встановлені у файлі .env")
 
+# Підпис запитів з попередньо ініціалізованим ключем (копіюється для кожного ордеру)
+ORDER_SIGNER = hmac.new(API_SECRET.encode(), digestmod=hashlib.sha256)
+
 # Ініціалізація глобальних змінних
 data_queue = queue.Queue(maxsize=1000) # Черга для обробки даних
 active_positions_lock = threading.Lock() # Блокування для активних позицій
@@ -64,22 +570,74 @@ base_coin = None # Базова монета для торгівлі
 quote_coin = None # Котирувальна монета для торгівлі
 base_precision = 8 # Точність символу (кількість знаків після коми)
 quote_precision = 2 # Точність котирувальної монети (кількість знаків після коми)
+price_factor = 10 ** 2 # Кількість тіків в одиниці котирувальної монети (фіксована точність цін)
+qty_factor = 10 ** 10 # Кількість одиниць в одиниці базової монети (фіксована точність кількості позицій)
 active_positions = [] # Список активних позицій
+history_last_time = None # Час (мс) останнього ордеру у файлі історії
 last_price = 0 # Остання ціна символу
+grid = None # Сітка рівнів купівлі
 accept_messages = True # Флаг для прийому повідомлень з WebSocket
+queued_price = None # Остання ціна, передана в чергу обробки
 ticker_log_time = 0 # Останній час логування потоку тікерів
 stats_log_time = 0 # Останній час логування статистики
 critical_sells_count = 0
 critical_buys_count = 0
+trading_halted = False # Флаг зупинки торгівлі через критичні помилки
+executor = None # Виконавець ордерів (пул потоків)
+order_intents_lock = threading.Lock() # Блокування для ордерів, що виконуються
+order_intents = set() # Ключі рівнів та позицій, для яких ордер вже виконується
+armed_orders_lock = threading.Lock() # Блокування для підготовлених ордерів
+armed_orders = {} # Підготовлені ордери за ключами рівнів та позицій
+armed_buy_levels = None # Рівні купівлі, для яких підготовлено ордери
+armed_sell_lot = None # Позиція, для якої підготовлено ордер на продаж
+trace_lock = threading.Lock() # Блокування для запису у файл трасування
+trace_file = None # Файл трасування
+trace_tick = 0 # Порядковий номер останнього отриманого тіку
+trace_context = threading.local() # Номер тіку, що обробляється потоком
+NO_TRACE = contextlib.nullcontext() # Порожній інтервал трасування (трасування вимкнено)
+rest_condition = threading.Condition() # Умова для планувальника REST запитів
+rest_waiting = {p: 0 for p in RestPriority} # Кількість запитів, що очікують, для кожного класу
+rest_buckets = {p: {"rate": r, "capacity": r, "tokens": r, "updated": 0.0, "blocked_until": 0.0} for p, r in REST_RATE_LIMITS.items()} # Бюджети запитів
+tick_record_lock = threading.Lock() # Блокування для запису тіків
+tick_record_file = None # Поточний файл запису тіків
+tick_record_day = None # День (UTC) поточного файлу запису тіків
+shadow_grids = None # Тіньові сітки
+shadow_report_time = 0 # Останній час звіту тіньових сіток
+ledger_lock = threading.Lock() # Блокування для журналу угод
+ledger_stats = None # Накопичувальна статистика журналу угод
+ledger_unsaved = 0 # Кількість записів журналу угод після останньої контрольної точки статистики
+executions_lock = threading.Lock() # Блокування для журналу якості виконання
+volatility_bps = 0.0 # Згладжена зміна ціни між тіками (у базисних пунктах)
+replay_simulation = None # Стан симульованого виконання ордерів при відтворенні тіків (None - живе виконання)
+log_muted = False # Вимкнення логування (тривала симуляція)
+
+def load_grid():
+    """
+    Побудова сітки рівнів купівлі відповідно до типу сітки (рівні в тіках фіксованої точності цін).
+    Для сітки з файлу рівні завантажуються зі списку цін у файлі.
+    """
+    global grid
+
+    levels = [to_ticks(level) for level in load_grid_levels()] if GRID_TYPE == GridType.CUSTOM else None
+    grid = Grid(GRID_TYPE, to_ticks(LEVEL_STEP), to_ticks(LEVEL_OFFSET), LEVEL_STEP_PERCENT, levels)
+    log(f"➗ Сітка рівнів купівлі: {GRID_TYPE.name}{f' ({len(grid.levels)} рівнів)' if grid.fixed else ''}")
+
+def load_grid_levels():
+    """
+    Завантаження рівнів сітки з файлу (список цін).
+    :return: Список рівнів
+    """
+    with open(LEVELS_FILE, "r") as f:
+        return [float(level) for level in json.load(f)]
 
 def load_instruments_info():
     """
     Отримання інформації про символ.
     """
-    global base_coin, quote_coin, base_precision, quote_precision
+    global base_coin, quote_coin, base_precision, quote_precision, price_factor, qty_factor
 
     # Отримання інформації про символ
-    instrument_info = session.get_instruments_info(category="spot", symbol=SYMBOL)
+    instrument_info = rest_call(RestPriority.HISTORY, session.get_instruments_info, category="spot", symbol=SYMBOL)
     if not instrument_info['result']['list']:
         raise ValueError("Невірний символ або відсутня інформація про нього")
 
@@ -99,12 +657,82 @@ def load_instruments_info():
     quote_precision = info['lotSizeFilter']['quotePrecision']
     quote_precision = len(quote_precision.split('.')[1]) if '.' in quote_precision else 0
 
+    # Фіксована точність цін та кількості
+    price_factor = 10 ** quote_precision
+    qty_factor = 10 ** (base_precision + QTY_EXTRA_PRECISION)
+
     # Виведення інформації про символ
     message = f"➗ Інструмент: {SYMBOL}"
     message += f", базова монета: {base_coin} (точність: {base_precision} знаків після коми)"
     message += f", котирувальна монета: {quote_coin} (точність: {quote_precision} знаків після коми)"
     log(message)
 
+def to_ticks(value):
+    """
+    Перетворення ціни (рядок або число) у тіки фіксованої точності котирувальної монети.
+    """
+    return round(float(value) * price_factor)
+
+def to_units(value):
+    """
+    Перетворення кількості (рядок або число) в одиниці фіксованої точності кількості позицій.
+    """
+    return round(float(value) * qty_factor)
+
+def to_lots(units):
+    """
+    Округлення кількості ВНИЗ до точності базової монети (кількість для ордеру).
+    :param units: Кількість в одиницях фіксованої точності
+    :return: Кількість в одиницях точності базової монети
+    """
+    return units // 10 ** QTY_EXTRA_PRECISION
+
+def format_fixed(value, precision):
+    """
+    Форматування невід'ємного числа фіксованої точності без перетворення у float.
+    :param value: Ціле число одиниць
+    :param precision: Кількість знаків після коми
+    """
+    whole, fraction = divmod(value, 10 ** precision)
+    return f"{whole}.{fraction:0{precision}d}" if precision else str(whole)
+
+def format_price(ticks):
+    """
+    Форматування ціни в тіках (без кінцевих нулів, як у відповідях біржі).
+    """
+    text = format_fixed(ticks, quote_precision)
+    return text.rstrip('0').rstrip('.') if '.' in text else text
+
+def format_qty(units):
+    """
+    Форматування кількості позиції (з додатковими знаками понад точність базової монети).
+    """
+    return format_fixed(units, base_precision + QTY_EXTRA_PRECISION)
+
+def parse_position(item):
+    """
+    Перетворення позиції з JSON (рядкові значення) у внутрішнє представлення з цілими значеннями фіксованої точності.
+    Значення розбираються один раз при завантаженні.
+    :param item: Позиція з файлу позицій
+    :return: Позиція
+    """
+    return Position(item['order_id'], item['date'], item['side'], to_ticks(item['price']), to_units(item['qty']), to_units(item['fee']))
+
+def format_position(pos):
+    """
+    Перетворення позиції у JSON представлення (рядкові значення, як у файлі позицій).
+    :param pos: Позиція
+    :return: Позиція для файлу позицій
+    """
+    return {
+        "order_id": pos.order_id,
+        "date": pos.date,
+        "side": pos.side,
+        "price": format_price(pos.price),
+        "qty": format_qty(pos.qty),
+        "fee": format_qty(pos.fee)
+    }
+
 def load_positions(force_api=True):
     """
     Завантажує активні позиції з файлу або відновлює їх з API, якщо файл відсутній або порожній.
@@ -120,7 +748,7 @@ def load_positions(force_api=True):
                 log("⚡ Відновлення позицій з файлу...")
                 try:
                     with open(POSITIONS_FILE, "r") as f:
-                        active_positions = json.load(f)
+                        active_positions = [parse_position(p) for p in json.load(f)]
                     log(f"✨ Отримано {len(active_positions)} ордерів з файлу")
                 except Exception as e:
                     log(f"❌ Помилка відновлення: {e}")
@@ -129,97 +757,184 @@ def load_positions(force_api=True):
             log("⚡ Відновлення позицій з API...")
             try:
                 log("⛽ Отримання історії ордерів...")
-                trades = get_full_history(180)
-                if not trades:
+                sync_history(180)
+
+                # Незакриті ордери на покупку (від нових до старих)
+                buys, count, executed = read_open_buys()
+                if not count:
                     log("⛽ Історія ордерів порожня")
                 else:
-                    log(f"⛽ Отримано {len(trades)} ордерів з історії")
-
-                # Фільтрація ордерів на покупку
-                buys = [t for t in trades if t['side'] == 'Buy']
-                # with open("buys.json", "w") as f:
-                #     json.dump(buys, f, indent=4)
-
-                # Фільтрація ордерів на продаж
-                sells = [t for t in trades if t['side'] == 'Sell']
-                # with open("sells.json", "w") as f:
-                #     json.dump(sells, f, indent=4)
-
-                # Отримуєм список закритих ордерів на покупку (ордер на продаж перекрив раніше відкритий ордер на покупку)
-                executed = [t['orderLinkId'] for t in sells]
+                    log(f"⛽ Отримано {count} ордерів з історії")
                 if executed:
-                    log(f"⛽ Перекриті ордери на покупку ({len(executed)} шт): {executed[:20]}...")
+                    log(f"⛽ Перекриті ордери на покупку: {executed} шт")
 
                 # Отримання балансу гаманця
                 _, _, _, equity_qty, _ = get_wallet_balance()
+                equity_qty = to_units(equity_qty)
 
                 # Відновлення позицій з історії ордерів
                 restored = []
                 if equity_qty > 0:
                     log("➰ Формування позицій з історії ордерів розпочато")
                     for b in buys:
-                        if f"BUY_{b['orderId']}" in executed:
-                            log(f"⚠️ Ордер {b['orderId']} вже закрито відповідним ордером на продаж, пропускаємо")
-                            continue
-
-                        log(f"➰ Залишковий розрахований еквіті: {format(equity_qty, f'.{base_precision+2}f')} {base_coin}", end="")
-                        log(f" ({format(equity_qty * last_price, '.2f')} {quote_coin})", datetime_prefix=False)
-
-                        qty = float(b['cumExecQty'])
-                        fee = float(b['cumFeeDetail'][base_coin]) if base_coin in b['cumFeeDetail'] else 0
-                        log(f"➰ Розмір ордеру: {format(qty, f'.{base_precision+2}f')} {base_coin}", end="")
-                        log(f" ({format(qty * last_price, '.2f')} {quote_coin})", datetime_prefix=False)
-
-                        linkId = b['orderLinkId']
-                        log(f"➰ Кастомний ідентифікатор ордеру: {linkId}")
-
-                        if equity_qty >= qty and (linkId.startswith("BOT_") or equity_qty * last_price >= 10): # TODO: тимчасово 10 USDT, після продажу на 75к - видалити
-                            restored.append({
-                                "order_id": b['orderId'],
-                                "date": datetime.fromtimestamp(int(b['createdTime'])/1000).strftime("%Y-%m-%d %H:%M:%S"),
-                                "side": "Buy",
-                                "price": b['avgPrice'],
-                                "qty": format(qty - fee, f'.{base_precision+2}f'), # Віднімаємо комісію
-                                "fee": format(fee, f'.{base_precision+2}f')
-                            })
-                            log(f"✨ Ордер {b['orderId']} додано в список позицій з історії ордерів")
-
-                            equity_qty -= qty
+                        log(f"➰ Залишковий розрахований еквіті: {format_qty(equity_qty)} {base_coin}", end="")
+                        log(f" ({format(equity_qty / qty_factor * last_price, '.2f')} {quote_coin})", datetime_prefix=False)
+
+                        log(f"➰ Розмір ордеру: {format_qty(b.qty)} {base_coin}", end="")
+                        log(f" ({format(b.qty / qty_factor * last_price, '.2f')} {quote_coin})", datetime_prefix=False)
+
+                        log(f"➰ Кастомний ідентифікатор ордеру: {b.link_id}")
+
+                        if equity_qty >= b.qty and (b.link_id.startswith("BOT_") or equity_qty / qty_factor * last_price >= 10): # TODO: тимчасово 10 USDT, після продажу на 75к - видалити
+                            restored.append(Position(
+                                b.order_id,
+                                datetime.fromtimestamp(b.created_time/1000).strftime("%Y-%m-%d %H:%M:%S"),
+                                "Buy",
+                                b.price,
+                                b.qty - b.fee, # Віднімаємо комісію
+                                b.fee
+                            ))
+                            log(f"✨ Ордер {b.order_id} додано в список позицій з історії ордерів")
+
+                            equity_qty -= b.qty
                         else:
                             break
                     log("➰ Формування позицій з історії ордерів завершено")
 
                 # Сортуємо за ціною (від більшої до меншої)
-                restored.sort(key=lambda x: float(x['price']), reverse=True)
+                restored.sort(key=lambda x: x.price, reverse=True)
 
                 # Оновлення активних позицій
                 active_positions = restored
 
                 # Збереження позицій у файл
                 with open(POSITIONS_FILE, "w") as f:
-                    json.dump(active_positions, f, indent=4)
+                    json.dump([format_position(p) for p in active_positions], f, indent=4)
             except Exception as e:
                 log(f"❌ Помилка відновлення: {e}")
 
-        if active_positions:
-            log(f"✨ Активні позиції ({len(active_positions)} шт): {active_positions}")
-        else:
-            log("✨ Позицій для відновлення не знайдено")
+        log(format_positions_summary())
+
+def format_positions_summary():
+    """
+    Короткий опис активних позицій для логу (кількість та діапазон цін замість повного списку).
+    :return: Текст опису
+    """
+    if not active_positions:
+        return "✨ Активних позицій немає"
+    prices = [p.price for p in active_positions]
+    return f"✨ Активні позиції ({len(active_positions)} шт): ціни від {format_price(min(prices))} до {format_price(max(prices))} {quote_coin}"
+
+def compact_history_order(trade):
+    """
+    Скорочення ордеру з відповіді біржі до полів, потрібних для відновлення позицій (рядок файлу історії).
+    :param trade: Ордер з історії ордерів біржі
+    :return: Компактний ордер (рядкові значення, як у відповіді біржі)
+    """
+    return {
+        "orderId": trade['orderId'],
+        "orderLinkId": trade['orderLinkId'],
+        "side": trade['side'],
+        "createdTime": trade['createdTime'],
+        "avgPrice": trade['avgPrice'],
+        "cumExecQty": trade['cumExecQty'],
+        "fee": trade['cumFeeDetail'].get(base_coin, "0") # Комісія в базовій монеті
+    }
+
+def parse_history_order(item):
+    """
+    Перетворення рядка файлу історії у компактний ордер з цілими значеннями фіксованої точності.
+    :param item: Компактний ордер з файлу історії
+    :return: Ордер з історії
+    """
+    return HistoryOrder(
+        item['orderId'],
+        item['orderLinkId'],
+        item['side'],
+        int(item['createdTime']),
+        to_ticks(item['avgPrice'] or 0),
+        to_units(item['cumExecQty']),
+        to_units(item['fee'])
+    )
+
+def iter_history(path=HISTORY_FILE):
+    """
+    Потокове читання файлу історії ордерів (від старих до нових) без завантаження усієї історії в пам'ять.
+    :param path: Шлях до файлу історії
+    :return: Генератор ордерів з історії
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield parse_history_order(json.loads(line))
+            except (json.JSONDecodeError, KeyError, ValueError):
+                continue # Пропускаємо пошкоджені рядки
+
+def read_open_buys(path=HISTORY_FILE):
+    """
+    Потокове читання історії ордерів з відбором ордерів на покупку, ще не закритих ордером на продаж
+    (ордер на продаж з ідентифікатором BUY_<id> перекриває раніше відкритий ордер на покупку).
+    У пам'яті залишаються лише незакриті ордери на покупку.
+    :param path: Шлях до файлу історії
+    :return: Незакриті ордери на покупку (від нових до старих), кількість ордерів в історії, кількість перекритих ордерів на покупку
+    """
+    open_buys = {}
+    count = 0
+    executed = 0
+    for order in iter_history(path):
+        count += 1
+        if order.side == 'Buy':
+            open_buys[order.order_id] = order
+        elif order.link_id.startswith("BUY_") and open_buys.pop(order.link_id[4:], None) is not None:
+            executed += 1
+    return sorted(open_buys.values(), key=lambda x: x.created_time, reverse=True), count, executed
+
+def migrate_history():
+    """
+    Одноразове перетворення файлу історії попереднього формату (JSON список повних ордерів) у компактний файл історії.
+    """
+    global history_last_time
 
-def get_full_history(days):
-    history_trades = []
-    if os.path.exists(HISTORY_FILE):
+    if os.path.exists(HISTORY_FILE) or not os.path.exists(LEGACY_HISTORY_FILE):
+        return
+
+    log("⛽ Перетворення файлу історії ордерів у компактний формат...")
+    try:
+        with open(LEGACY_HISTORY_FILE, "r") as f:
+            trades = json.load(f)
+        trades.sort(key=lambda x: int(x['createdTime']))
+
+        # Запис у тимчасовий файл, щоб перерваний запис не залишив неповну історію
+        with open(HISTORY_FILE + ".tmp", "w") as f:
+            for trade in trades:
+                f.write(json.dumps(compact_history_order(trade)) + "\n")
+        os.replace(HISTORY_FILE + ".tmp", HISTORY_FILE)
+        history_last_time = None # Час останнього ордеру буде визначено з нового файлу
+        log(f"⛽ Перетворено {len(trades)} ордерів з файлу {LEGACY_HISTORY_FILE}")
+    except Exception as e:
+        log(f"❌ Помилка: {e}")
+
+def sync_history(days):
+    """
+    Синхронізація файлу історії ордерів з API: до файлу дописуються лише ордери, новіші за останній ордер у файлі.
+    Файл містить компактні ордери по одному в рядку (від старих до нових), тож історія не завантажується в пам'ять повністю.
+    :param days: Глибина історії (у днях), якщо файл історії порожній
+    :return: Кількість нових ордерів
+    """
+    global history_last_time
+
+    migrate_history()
+
+    # Час останнього ордеру у файлі визначається один раз, далі оновлюється при дописуванні
+    if history_last_time is None:
         log("⛽ Отримання історії ордерів з файлу...")
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                history_trades = json.load(f)
-            log(f"⛽ Отримано {len(history_trades)} ордерів з файлу")
-        except Exception as e:
-            log(f"❌ Помилка: {e}")
+        history_last_time = 0
+        for order in iter_history():
+            history_last_time = max(history_last_time, order.created_time)
 
-    last_trade_time = 0
-    if history_trades:
-        last_trade_time = float(history_trades[0]['createdTime'])
+    last_trade_time = history_last_time
     log(f"⛽ Дата останнього ордеру: {datetime.fromtimestamp(last_trade_time/1000).strftime('%Y-%m-%d %H:%M:%S')}")
 
     current_time = int(time.time() * 1000)
@@ -229,7 +944,7 @@ def get_full_history(days):
     temp_end_time = current_time
     temp_start_time = temp_end_time - MS_IN_7_DAYS
 
-    all_trades = []
+    new_trades = []
     stop = False
     while temp_end_time > target_start_time:
         log(f"⛽ Запит періоду: ", end="")
@@ -238,7 +953,9 @@ def get_full_history(days):
 
         cursor = None
         while True:
-            response = session.get_order_history(
+            response = rest_call(
+                RestPriority.HISTORY,
+                session.get_order_history,
                 category="spot",
                 symbol=SYMBOL,
                 limit=50,
@@ -252,7 +969,7 @@ def get_full_history(days):
 
             result = response.get('result', {})
 
-            # Додавання усіх ордерів до списку
+            # Додавання нових ордерів до списку (лише потрібні поля)
             trades = result.get('list', [])
             if trades:
                 # Сортуємо за датою (від нових до старих)
@@ -260,23 +977,20 @@ def get_full_history(days):
 
                 # Залишаємо тільки нові ордери, що знаходяться після останнього ордера з історії
                 for trade in trades:
-                    if float(trade['createdTime']) <= last_trade_time:
+                    if int(trade['createdTime']) <= last_trade_time:
                         stop = True
                         break
-                    all_trades.append(trade)
+                    new_trades.append(compact_history_order(trade))
 
             # Ордери з історії синхронізовані
             if stop:
                 break
 
-            # Перевіряємо, чи є наступна сторінка
+            # Перевіряємо, чи є наступна сторінка (частоту запитів обмежує планувальник REST запитів)
             cursor = result.get('nextPageCursor')
             if not cursor:
                 break
 
-            # Невеликий sleep, щоб не отримати бан за ліміт запитів (Rate Limit)
-            time.sleep(0.25)
-
         # Зсуваємо вікно на 7 днів назад
         temp_end_time = temp_start_time
         temp_start_time -= MS_IN_7_DAYS
@@ -285,17 +999,16 @@ def get_full_history(days):
         if stop:
             break
 
-    # Додавання усіх ордерів з файлу історії
-    all_trades.extend(history_trades)
-
-    # Сортуємо за датою створення (від нових до старих)
-    all_trades.sort(key=lambda x: x['createdTime'], reverse=True)
+    # Дописуємо нові ордери у файл історії (від старих до нових)
+    if new_trades:
+        new_trades.sort(key=lambda x: int(x['createdTime']))
+        with open(HISTORY_FILE, "a") as f:
+            for trade in new_trades:
+                f.write(json.dumps(trade) + "\n")
+        history_last_time = int(new_trades[-1]['createdTime'])
+    log(f"⛽ Отримано {len(new_trades)} нових ордерів з API")
 
-    # Збереження історії у файл
-    with open("history.json", "w") as f:
-        json.dump(all_trades, f, indent=4)
-
-    return all_trades
+    return len(new_trades)
 
 def get_wallet_balance(log_output=True):
     """
@@ -305,7 +1018,8 @@ def get_wallet_balance(log_output=True):
     if log_output:
         log("⛳ Отримання балансу гаманця...")
 
-    balance_info = session.get_wallet_balance(accountType="UNIFIED", coin=base_coin)
+    with trace_span("get_wallet_balance"):
+        balance_info = rest_call(RestPriority.BALANCE, session.get_wallet_balance, accountType="UNIFIED", coin=base_coin)
     if balance_info.get('retCode') != 0:
         raise ValueError(f"❌ Помилка отримання балансу: {balance_info.get('retMsg')}")
     if not 'result' in balance_info or not 'list' in balance_info['result'] or not balance_info['result']['list']:
@@ -327,81 +1041,226 @@ def get_wallet_balance(log_output=True):
 
     return total_balance, total_equity, balance_qty, equity_qty, usd_value
 
+def create_session():
+    """
+    Створення сесії API (з заголовками відповіді для планувальника REST запитів).
+    :return: Сесія API
+    """
+    return HTTP(testnet=False, demo=DEMO_MODE, api_key=API_KEY, api_secret=API_SECRET, recv_window=RECV_WINDOW, return_response_headers=True)
+
+def rest_call(priority, method, **kwargs):
+    """
+    Виконання REST запиту через планувальник запитів.
+    Запити виконуються в межах бюджету свого класу, а запити нижчого пріоритету
+    очікують, поки є запити вищого пріоритету (ордери > перевірка виконання > баланс > історія).
+    :param priority: Клас запиту (RestPriority)
+    :param method: Метод сесії API
+    :param kwargs: Параметри запиту
+    :return: Відповідь API
+    """
+    rest_acquire(priority)
+
+    response = method(**kwargs)
+    if isinstance(response, tuple):
+        response, _, headers = response
+        rest_adapt(priority, headers)
+
+    return response
+
+def rest_acquire(priority):
+    """
+    Очікування дозволу на виконання REST запиту.
+    :param priority: Клас запиту (RestPriority)
+    """
+    with rest_condition:
+        rest_waiting[priority] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                bucket = rest_buckets[priority]
+
+                # Поповнення бюджету
+                bucket['tokens'] = min(bucket['capacity'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+                bucket['updated'] = now
+
+                # Запити вищого пріоритету виконуються першими
+                if any(rest_waiting[p] for p in RestPriority if p.value < priority.value):
+                    rest_condition.wait(0.05)
+                    continue
+
+                if now < bucket['blocked_until']:
+                    rest_condition.wait(bucket['blocked_until'] - now)
+                    continue
+
+                if bucket['tokens'] < 1:
+                    rest_condition.wait((1 - bucket['tokens']) / bucket['rate'])
+                    continue
+
+                bucket['tokens'] -= 1
+                return
+        finally:
+            rest_waiting[priority] -= 1
+            rest_condition.notify_all()
+
+def rest_adapt(priority, headers):
+    """
+    Адаптація бюджету класу запитів до лімітів, що повертає біржа в заголовках відповіді.
+    :param priority: Клас запиту (RestPriority)
+    :param headers: Заголовки відповіді
+    """
+    limit = headers.get('X-Bapi-Limit')
+    remaining = headers.get('X-Bapi-Limit-Status')
+    if not limit or remaining is None:
+        return
+
+    with rest_condition:
+        bucket = rest_buckets[priority]
+
+        # Бюджет з запасом відносно ліміту ендпоінта
+        rate = max(float(limit) * REST_LIMIT_USAGE, 1)
+        bucket['rate'] = rate
+        bucket['capacity'] = rate
+        bucket['tokens'] = min(bucket['tokens'], float(remaining), rate)
+
+        # Ліміт вичерпано: очікуємо до його скидання
+        reset_time = headers.get('X-Bapi-Limit-Reset-Timestamp')
+        if int(remaining) <= 0 and reset_time:
+            delay = (int(reset_time) - time.time() * 1000) / 1000
+            if delay > 0:
+                bucket['blocked_until'] = time.monotonic() + delay
+                log(f"⚠️ Ліміт запитів класу {priority.name} вичерпано, очікування {delay:.2f} сек")
+
+        rest_condition.notify_all()
+
 def handle_message(message):
     """
     Обробка повідомлень з WebSocket стріму тікерів.
     :param message: Повідомлення
     """
-    # Ігноруємо повідомлення, якщо прийом вимкнено
-    if not accept_messages:
+    if 'data' not in message:
+        return
+
+    try:
+        tick = normalize_tick(message)
+    except (KeyError, ValueError):
+        return # Ігноруємо неочікувані повідомлення
+
+    handle_tick(tick, time.time_ns() if TRACE_ENABLED else 0)
+
+def handle_tick(tick, received_ns=0):
+    """
+    Передача тіку в чергу обробки. Тіки без зміни ціни відкидаються до черги.
+    :param tick: Тік (час, остання ціна, об'єм)
+    :param received_ns: Час отримання (для трасування)
+    """
+    global queued_price
+
+    # Запис усіх отриманих тіків, незалежно від прийому повідомлень
+    if TICK_RECORDING:
+        record_tick(tick)
+
+    # Ігноруємо тік, якщо прийом вимкнено або торгівлю зупинено
+    if not accept_messages or trading_halted:
         # log("⚠️ Прийом повідомлень тимчасово вимкнено")
         return
 
-    # Додаємо повідомлення у чергу для обробки
-    if 'data' in message:
-        data_queue.put(message['data'])
+    # Ігноруємо тік, якщо ціна не змінилася
+    if tick[1] == queued_price:
+        return
+    queued_price = tick[1]
+
+    # Додаємо тік у чергу для обробки (разом з часом отримання для трасування)
+    data_queue.put((tick, received_ns))
 
 def worker(stop_event):
     """
     Обробка повідомлень з черги.
     """
-    global accept_messages
+    global accept_messages, trace_tick
 
     # Очікуємо нове повідомлення в черзі
     while not stop_event.is_set():
-        data = data_queue.get()
-        if data is None:
+        try:
+            item = data_queue.get(timeout=WORKER_POLL_INTERVAL_SECONDS)
+        except queue.Empty:
+            continue # Тіки не надходять (наприклад, торгівлю зупинено), перевіряємо сигнал зупинки
+        if item is None:
             log("⚙️ Робочий потік зупинено")
             break
 
+        tick, received_ns = item
+
+        # Трасування часу очікування в черзі
+        if TRACE_ENABLED:
+            trace_tick += 1
+            trace_context.tick = trace_tick
+            trace_event("queue", received_ns, time.time_ns(), {"tick": trace_tick})
+
         try:
             accept_messages = False # Блокування прийому нових повідомлень під час обробки
-            process_data(data)
+            with trace_span("process_data"):
+                process_data(tick)
         except Exception as e:
             log(f"❌ Помилка обробки даних: {e}")
         finally:
             accept_messages = True # Розблокування прийому повідомлень після обробки
             data_queue.task_done()
+            if TRACE_ENABLED:
+                flush_trace()
 
-def process_data(data):
+def process_data(tick):
     """
-    Обробка отриманих даних.
-    :param data: Дані повідомлення
+    Обробка отриманого тіку.
+    :param tick: Тік (час, остання ціна, об'єм)
     """
-    global last_price, ticker_log_time, stats_log_time
+    global last_price, ticker_log_time, stats_log_time, volatility_bps
 
     try:
         # Отримуємо поточну ціну
-        current_price = float(data['lastPrice'])
+        current_price = tick[1]
 
         # Перевірка останньої (попередньої) отриманої ціни
         if last_price <= 0:
             last_price = current_price
             return # Ігноруємо перше повідомлення, яке встановлює базову ціну
 
+        # Ціни в тіках фіксованої точності для точних порівнянь з рівнями
+        current_ticks = to_ticks(current_price)
+        last_ticks = to_ticks(last_price)
+
         # Перевірка на зміну ціни
-        if math.isclose(current_price, last_price):
+        if current_ticks == last_ticks:
             return # Ігноруємо, якщо ціна не змінилася
 
+        # Оновлення волатильності для аналітики якості виконання
+        volatility_bps += VOLATILITY_EWMA_ALPHA * (abs(current_price - last_price) / last_price * 10000 - volatility_bps)
+
+        # Підготовка ордеру на продаж для наступної позиції
+        arm_sell_order()
+
         # Перевірка на виконання продажу відповідно до поточної ціни
-        check_and_execute_sell(current_price)
+        check_and_execute_sell(current_ticks)
 
         # Розрахунок наступних рівнів купівлі
-        next_lower_buy_level = get_next_lower_buy_level()
-        next_upper_buy_level = get_next_upper_buy_level()
+        with trace_span("levels"):
+            next_lower_buy_level = get_next_lower_buy_level(last_ticks)
+            next_upper_buy_level = get_next_upper_buy_level(last_ticks)
+
+        # Підготовка ордерів для наступних рівнів купівлі
+        arm_buy_orders(next_lower_buy_level, next_upper_buy_level)
 
         # Перевірка на виконання купівлі відповідно до поточної ціни
-        check_and_execute_buy(current_price, next_lower_buy_level, next_upper_buy_level)
+        check_and_execute_buy(current_ticks, last_ticks, next_lower_buy_level, next_upper_buy_level)
 
         # Розрахунок наступного рівня продажу
-        next_sell_price = min([float(p['price']) + PROFIT_TARGET for p in active_positions]) if active_positions else None
+        next_sell_price = min([p.price for p in active_positions]) / price_factor + PROFIT_TARGET if active_positions else None
 
         # Виведення інформації
         message = f"Минула ціна: {f"{last_price:.2f}"}"
         message += f" | Поточна ціна: {f"{current_price:.2f}"}"
         message += f" | Позицій: {len(active_positions)}"
-        message += f" | Наст.купівля знизу: {f"{next_lower_buy_level:.2f}"}"
-        message += f" | Наст.купівля зверху: {f"{next_upper_buy_level:.2f}"}"
+        message += f" | Наст.купівля знизу: {f"{next_lower_buy_level / price_factor:.2f}" if next_lower_buy_level is not None else "немає"}"
+        message += f" | Наст.купівля зверху: {f"{next_upper_buy_level / price_factor:.2f}" if next_upper_buy_level is not None else "немає"}"
         message += f" | Наст.продаж: {f"{next_sell_price:.2f}" if next_sell_price else "немає"}"
         log(message, file_output=False)
 
@@ -412,7 +1271,7 @@ def process_data(data):
             log(message, console_output=False)
             ticker_log_time = current_time
 
-        # Логування статистики
+        # Логування статистики (крім відтворення тіків)
         stats_interval_seconds = 60 * STATS_LOG_INTERVAL_MINS
         current_time = int((datetime.now().timestamp() // stats_interval_seconds) * stats_interval_seconds)
         stats_log_time = 0
@@ -420,161 +1279,350 @@ def process_data(data):
             with open(STATS_LOG_FILE, "r") as f:
                 value = f.readline().strip()
                 stats_log_time = int(value) if value.isdigit() else 0
-        if stats_log_time != current_time and current_time % stats_interval_seconds == 0:
+        if stats_log_time != current_time and current_time % stats_interval_seconds == 0 and replay_simulation is None:
             log_stats()
             with open(STATS_LOG_FILE, "w") as f:
                 f.write(str(current_time))
 
+        # Симуляція тіньових сіток
+        if shadow_grids is not None:
+            process_shadow_grids(current_price)
+
         # Оновлення останньої ціни
         last_price = current_price
-    except KeyError:
-        pass # Ігноруємо неочікувані повідомлення
     except Exception as e:
         log(f"❌ Помилка в обробці WebSocket повідомлення: {e}")
 
-def check_and_execute_sell(current_price):
+def check_and_execute_sell(current_ticks):
     """
-    Перевіряє активні позиції на досягнення цільового рівня прибутку та виконує продаж.
-    :param current_price: Поточна ціна для порівняння з рівнями продажу
+    Перевіряє активні позиції на досягнення цільового рівня прибутку та передає продаж на виконання.
+    :param current_ticks: Поточна ціна (у тіках) для порівняння з рівнями продажу
     """
-    global last_price, critical_sells_count, accept_messages
-
+    profit_ticks = to_ticks(PROFIT_TARGET)
     for pos in active_positions:
-        sell_price = float(pos['price']) + PROFIT_TARGET
-        if current_price >= sell_price:
-            try:
-                log(f"⚾ Ціна {current_price:.2f} досягла рівня продажу {sell_price:.2f} для позиції купівлі по {pos['price']} для ордеру {pos['order_id']}")
+        if current_ticks >= pos.price + profit_ticks:
+            current_price = current_ticks / price_factor
+            sell_price = (pos.price + profit_ticks) / price_factor
+            submit_order_intent(f"LOT_{pos.order_id}", execute_sell, pos, current_price, new_execution("Sell", current_price, sell_price))
 
-                # Отримання балансу гаманця
-                _, _, balance_qty, _, _ = get_wallet_balance()
-
-                # Округлюємо кількість ВНИЗ до потрібної точності
-                factor = 10 ** base_precision
-
-                # Доступний баланс
-                balance_qty = math.floor(balance_qty * factor) / factor
-
-                # Потрібна кількість для продажу
-                needed_qty = float(pos['qty'])
-                needed_qty = math.floor(needed_qty * factor) / factor
-                log(f"✊ Потрібно продати: {format(needed_qty, f'.{base_precision+2}f'):} {base_coin}")
-
-                # Перевіряємо, чи вистачає балансу
-                if balance_qty < needed_qty:
-                    log(f"⚠️ Недостатньо балансу {base_coin}: Треба {format(needed_qty, f'.{base_precision+2}f')}, є {format(balance_qty, f'.{base_precision+2}f')}")
-                    # Тут можна або пропустити, або спробувати продати те, що є:
-                    # continue
-                    needed_qty = balance_qty
-
-                if needed_qty <= 0:
-                    log(f"❌ Потрібна кількість {base_coin} для продажу недостатня")
-                    # Оновлюємо позиції, щоб уникнути розбіжностей
-                    load_positions()
-                    break
+def execute_sell(pos, current_price, execution=None):
+    """
+    Виконує продаж позиції та очікує підтвердження виконання (в потоці виконавця ордерів).
+    :param pos: Позиція для продажу
+    :param current_price: Ціна, при якій було прийнято рішення про продаж
+    :param execution: Запис якості виконання, створений при прийнятті рішення
+    """
+    global critical_sells_count
 
-                log(f"⚽ Спроба продажу по {current_price}...")
-                order = session.place_order(
+    sell_price = pos.price / price_factor + PROFIT_TARGET
+    execution = execution or new_execution("Sell", current_price, sell_price)
+    try:
+        log(f"⚾ Ціна {current_price:.2f} досягла рівня продажу {sell_price:.2f} для позиції купівлі по {format_price(pos.price)} для ордеру {pos.order_id}")
+
+        # Розміщення підготовленого ордеру (без запиту балансу та підготовки запиту)
+        order = None
+        armed = take_armed_order(f"LOT_{pos.order_id}")
+        if armed:
+            log(f"⚽ Спроба продажу по {current_price} підготовленим ордером...")
+            with trace_span("place_order", side="Sell", armed=True):
+                execution['send_time'] = time.time() * 1000
+                order = rest_call(RestPriority.ORDER, send_armed_order, armed=armed)
+                record_ack(execution, order)
+            if order.get('retCode') != 0:
+                log(f"⚠️ Підготовлений ордер відхилено: {order.get('retMsg')}, повторна спроба з перевіркою балансу")
+                order = None
+
+        if order is None:
+            # Отримання балансу гаманця
+            _, _, balance_qty, _, _ = get_wallet_balance()
+
+            # Округлюємо кількість ВНИЗ до точності базової монети
+            # Доступний баланс
+            balance_qty = to_lots(to_units(balance_qty))
+
+            # Потрібна кількість для продажу
+            needed_qty = to_lots(pos.qty)
+            log(f"✊ Потрібно продати: {format_fixed(needed_qty, base_precision)} {base_coin}")
+
+            # Перевіряємо, чи вистачає балансу
+            if balance_qty < needed_qty:
+                log(f"⚠️ Недостатньо балансу {base_coin}: Треба {format_fixed(needed_qty, base_precision)}, є {format_fixed(balance_qty, base_precision)}")
+                # Тут можна або пропустити, або спробувати продати те, що є:
+                # continue
+                needed_qty = balance_qty
+
+            if needed_qty <= 0:
+                log(f"❌ Потрібна кількість {base_coin} для продажу недостатня")
+                record_execution(execution, status="NoBalance")
+                # Оновлюємо позиції, щоб уникнути розбіжностей
+                load_positions()
+                return
+
+            log(f"⚽ Спроба продажу по {current_price}...")
+            with trace_span("place_order", side="Sell"):
+                execution['send_time'] = time.time() * 1000
+                order = rest_call(
+                    RestPriority.ORDER,
+                    session.place_order,
                     category="spot",
                     symbol=SYMBOL,
                     side="Sell",
                     orderType="Market",
-                    qty=format(needed_qty, f'.{base_precision}f'),
-                    orderLinkId=f"BUY_{pos['order_id']}"
+                    qty=format_fixed(needed_qty, base_precision),
+                    orderLinkId=f"BUY_{pos.order_id}"
                 )
-                if order.get('retCode') != 0:
-                    log(f"❌ Помилка розміщення ордеру: {order.get('retMsg')}")
-                    continue
+                record_ack(execution, order)
+            if order.get('retCode') != 0:
+                log(f"❌ Помилка розміщення ордеру: {order.get('retMsg')}")
+                record_execution(execution, status="Error")
+                return
 
-                order_id = order['result']['orderId']
-                log(f"⛵ Ордер на продаж {order_id} розміщено. Очікування виконання...")
-                is_filled = False
-
-                # Перевірка статусу
-                for _ in range(RETRY_COUNT):
-                    time.sleep(RETRY_DELAY_SECONDS) # Затримка перед перевіркою
-
-                    log(f"⛽ Отримання історії ордерів для ордеру на продаж {order_id}...")
-                    history = session.get_order_history(
-                        category="spot",
-                        symbol=SYMBOL,
-                        orderId=order_id
-                    )
-                    if history.get('retCode') != 0:
-                        log(f"❌ Помилка отримання історії ордерів: {history.get('retMsg')}")
-                        continue
-                    # log(f"Історія ордеру: {check}")
-
-                    # Отримуємо інформацію про ордер з історії
-                    trades = history['result']['list']
-                    if not trades:
-                        log(f"⚠️ Ордер на продаж {order_id} не знайдено в історії ордерів")
-                        continue
-
-                    order_data = trades[0]
-                    log(f"⛽ Ордер на продаж {order_data['orderId']} отримано з історії: {order_data}")
-
-                    # Перевіряємо статус ордера
-                    status = order_data['orderStatus']
-                    if status == "Filled":
-                        log(f"✅ Ордер на продаж {order_data['orderId']} виконано")
-
-                        # Оновлюємо позиції, щоб уникнути розбіжностей
-                        load_positions()
-
-                        # Отримуємо реальну ціну виконання
-                        exec_price = float(order_data.get('avgPrice', current_price))
-                        profit = (exec_price - float(pos['price'])) * float(pos['qty'])
-
-                        # Отримуємо час виконання
-                        exec_time = order_data.get('execTime', 0)
-                        exec_time = datetime.fromtimestamp(int(exec_time)/1000) if exec_time else datetime.now()
-                        timedelta = exec_time - datetime.strptime(pos['date'], '%Y-%m-%d %H:%M:%S')
-
-                        message = f"⚽ Продано {pos['qty']} {base_coin} по ціні {exec_price} {quote_coin},"
-                        message += f" що становить {format(float(pos['qty']) * exec_price, '.2f')} {quote_coin},"
-                        message += f" приблизний прибуток {format(profit, '.2f')} {quote_coin}."
-                        message += f" Ордер на продаж {order_data['orderId']} виконано,"
-                        message += f" ціна досягала {format(current_price, '.2f')} {quote_coin}."
-                        message += f" Ордер на покупку {pos['order_id']} був розміщений {pos['date']}"
-                        message += f" по ціні {pos['price']} {quote_coin}"
-                        message += f" та тривав до {exec_time.strftime('%Y-%m-%d %H:%M:%S')},"
-                        message += f" загальний час утримання позиції склав {format_timedelta(timedelta)}."
-                        log(message)
-
-                        # Записуємо в лог-файл
-                        log_trade(pos, "SELL", exec_price, profit=profit)
-
-                        # Оповіщаємо в Telegram
-                        send_telegram(message)
-
-                        is_filled = True
-                        break
-                    elif status in ["Cancelled", "Rejected"]:
-                        log(f"❎ Ордер {order_data['orderId']} скасовано або відхилено, статус: {status}")
-                        break
-                    else:
-                        log(f"❎ Ордер {order_data['orderId']} не виконано, статус: {status}")
-                        continue
+        order_id = order['result']['orderId']
+        execution['order_id'] = order_id
+        log(f"⛵ Ордер на продаж {order_id} розміщено. Очікування виконання...")
+        is_filled = False
+        fill_start_ns = time.time_ns()
 
-                if not is_filled:
-                    log(f"❎ Ордер {order_data['orderId']} розміщено, але статус 'Filled' не підтверджено")
+        # Перевірка статусу
+        for _ in range(RETRY_COUNT):
+            time.sleep(RETRY_DELAY_SECONDS) # Затримка перед перевіркою
 
-                critical_sells_count = 0
-            except Exception as e:
-                log(f"❌ КРИТИЧНА ПОМИЛКА при продажі: {e}")
-
-                # Збільшуємо лічильник критичних помилок і завершуємо роботу, якщо досягнуто ліміт
-                critical_sells_count += 1
-                if critical_sells_count >= RETRY_COUNT:
-                    accept_messages = False
-                    send_telegram(f"❌ Критична помилка при продажі, бот зупинено: {e}")
-                    log("❌ Бот зупинено")
-                    sys.exit(1)
-
-                time.sleep(RETRY_DELAY_SECONDS) # Затримка перед можливою повторною спробою
-                log("⚠️ Додатково відновлюємо позиції...")
+            log(f"⛽ Отримання історії ордерів для ордеру на продаж {order_id}...")
+            with trace_span("get_order_history", side="Sell"):
+                history = rest_call(
+                    RestPriority.FILL,
+                    session.get_order_history,
+                    category="spot",
+                    symbol=SYMBOL,
+                    orderId=order_id
+                )
+            if history.get('retCode') != 0:
+                log(f"❌ Помилка отримання історії ордерів: {history.get('retMsg')}")
+                continue
+            # log(f"Історія ордеру: {check}")
+
+            # Отримуємо інформацію про ордер з історії
+            trades = history['result']['list']
+            if not trades:
+                log(f"⚠️ Ордер на продаж {order_id} не знайдено в історії ордерів")
+                continue
+
+            order_data = trades[0]
+            log(f"⛽ Ордер на продаж {order_data['orderId']} отримано з історії: {order_data}")
+
+            # Перевіряємо статус ордера
+            status = order_data['orderStatus']
+            execution['status'] = status
+            if status == "Filled":
+                execution['fill_time'] = int(order_data.get('updatedTime') or time.time() * 1000)
+                execution['fill_price'] = float(order_data.get('avgPrice') or 0) or None
+                log(f"✅ Ордер на продаж {order_data['orderId']} виконано")
+
+                # Оновлюємо позиції, щоб уникнути розбіжностей
                 load_positions()
 
+                # Отримуємо реальну ціну виконання
+                exec_price = float(order_data.get('avgPrice', current_price))
+                profit = (exec_price - pos.price / price_factor) * pos.qty / qty_factor
+
+                # Отримуємо час виконання
+                exec_time = order_data.get('execTime', 0)
+                exec_time = datetime.fromtimestamp(int(exec_time)/1000) if exec_time else datetime.now()
+                timedelta = exec_time - datetime.strptime(pos.date, '%Y-%m-%d %H:%M:%S')
+
+                message = f"⚽ Продано {format_qty(pos.qty)} {base_coin} по ціні {exec_price} {quote_coin},"
+                message += f" що становить {format(pos.qty / qty_factor * exec_price, '.2f')} {quote_coin},"
+                message += f" приблизний прибуток {format(profit, '.2f')} {quote_coin}."
+                message += f" Ордер на продаж {order_data['orderId']} виконано,"
+                message += f" ціна досягала {format(current_price, '.2f')} {quote_coin}."
+                message += f" Ордер на покупку {pos.order_id} був розміщений {pos.date}"
+                message += f" по ціні {format_price(pos.price)} {quote_coin}"
+                message += f" та тривав до {exec_time.strftime('%Y-%m-%d %H:%M:%S')},"
+                message += f" загальний час утримання позиції склав {format_timedelta(timedelta)}."
+                log(message)
+
+                # Записуємо в лог-файл
+                log_trade(pos, "SELL", exec_price, profit=profit, exec_time=exec_time)
+
+                # Оповіщаємо в Telegram
+                send_telegram(message)
+
+                is_filled = True
+                break
+            elif status in ["Cancelled", "Rejected"]:
+                log(f"❎ Ордер {order_data['orderId']} скасовано або відхилено, статус: {status}")
+                break
+            else:
+                log(f"❎ Ордер {order_data['orderId']} не виконано, статус: {status}")
+                continue
+
+        # Запис якості виконання ордеру
+        record_execution(execution)
+
+        # Трасування підтвердження виконання
+        if TRACE_ENABLED:
+            trace_event("fill_confirm", fill_start_ns, time.time_ns(), {"tick": getattr(trace_context, 'tick', 0), "side": "Sell", "filled": is_filled})
+
+        if not is_filled:
+            log(f"❎ Ордер {order_data['orderId']} розміщено, але статус 'Filled' не підтверджено")
+
+        critical_sells_count = 0
+    except Exception as e:
+        log(f"❌ КРИТИЧНА ПОМИЛКА при продажі: {e}")
+
+        # Збільшуємо лічильник критичних помилок і завершуємо роботу, якщо досягнуто ліміт
+        critical_sells_count += 1
+        if critical_sells_count >= RETRY_COUNT:
+            halt_trading(f"❌ Критична помилка при продажі, бот зупинено: {e}")
+            return
+
+        time.sleep(RETRY_DELAY_SECONDS) # Затримка перед можливою повторною спробою
+        log("⚠️ Додатково відновлюємо позиції...")
+        load_positions()
+
+def prepare_order(side, qty, link_id):
+    """
+    Підготовка ринкового ордеру: тіло запиту, дані для підпису та заголовки.
+    :param side: 'Buy' або 'Sell'
+    :param qty: Відформатована кількість
+    :param link_id: Кастомний ідентифікатор ордеру
+    :return: Підготовлений ордер
+    """
+    body = json.dumps({"category": "spot", "symbol": SYMBOL, "side": side, "orderType": "Market", "qty": qty, "orderLinkId": link_id})
+    headers = {
+        "Content-Type": "application/json",
+        "X-BAPI-API-KEY": API_KEY,
+        "X-BAPI-SIGN-TYPE": "2",
+        "X-BAPI-RECV-WINDOW": str(RECV_WINDOW)
+    }
+    return ArmedOrder(side, qty, link_id, body.encode(), (API_KEY + str(RECV_WINDOW) + body).encode(), headers)
+
+def arm_buy_orders(lower_buy_level, upper_buy_level):
+    """
+    Підготовка ордерів для наступних нижнього та верхнього рівнів купівлі.
+    Ордери готуються лише при зміні рівнів, тож при перетині лишається підписати та відправити запит.
+    :param lower_buy_level: Нижній рівень купівлі
+    :param upper_buy_level: Верхній рівень купівлі
+    """
+    global armed_buy_levels
+
+    levels = (lower_buy_level, upper_buy_level)
+    if levels == armed_buy_levels:
+        return
+    armed_buy_levels = levels
+
+    keys = {f"LEVEL_{level}" for level in levels if level is not None}
+    with armed_orders_lock:
+        for key in [k for k in armed_orders if k.startswith("LEVEL_") and k not in keys]:
+            del armed_orders[key]
+        for key in keys:
+            if key not in armed_orders:
+                armed_orders[key] = prepare_order("Buy", str(ORDER_SIZE), f"BOT_{''.join(random.choices(string.digits, k=20))}")
+
+def arm_sell_order():
+    """
+    Підготовка ордеру на продаж для наступної позиції (з найменшою ціною купівлі).
+    Кількість округлюється ВНИЗ до точності базової монети, баланс перевіряється лише при відхиленні ордеру.
+    """
+    global armed_sell_lot
+
+    pos = min(active_positions, key=lambda p: p.price) if active_positions else None
+    lot = pos.order_id if pos else None
+    if lot == armed_sell_lot:
+        return
+    armed_sell_lot = lot
+
+    with armed_orders_lock:
+        for key in [k for k in armed_orders if k.startswith("LOT_") and k != f"LOT_{lot}"]:
+            del armed_orders[key]
+        if pos and f"LOT_{lot}" not in armed_orders:
+            qty = format_fixed(to_lots(pos.qty), base_precision)
+            armed_orders[f"LOT_{lot}"] = prepare_order("Sell", qty, f"BUY_{lot}")
+
+def take_armed_order(key):
+    """
+    Отримання підготовленого ордеру (ордер використовується один раз).
+    :param key: Ключ рівня або позиції
+    :return: Підготовлений ордер або None
+    """
+    global armed_buy_levels, armed_sell_lot
+
+    with armed_orders_lock:
+        armed = armed_orders.pop(key, None)
+        if armed:
+            # Підготовка нових ордерів на наступному тіку
+            armed_buy_levels = None
+            armed_sell_lot = None
+        return armed
+
+def send_armed_order(armed):
+    """
+    Підпис та відправка підготовленого ордеру через з'єднання сесії API.
+    :param armed: Підготовлений ордер
+    :return: Відповідь API, час виконання та заголовки відповіді (як у сесії API)
+    """
+    timestamp = str(int(time.time() * 1000))
+    signer = ORDER_SIGNER.copy()
+    signer.update(timestamp.encode())
+    signer.update(armed.suffix)
+
+    headers = dict(armed.headers)
+    headers["X-BAPI-TIMESTAMP"] = timestamp
+    headers["X-BAPI-SIGN"] = signer.hexdigest()
+
+    response = session.client.post(f"{session.endpoint}/v5/order/create", data=armed.body, headers=headers, timeout=10)
+    return response.json(), response.elapsed, response.headers
+
+def submit_order_intent(key, execute, *args):
+    """
+    Передача наміру розміщення ордеру виконавцю ордерів.
+    Для одного рівня або однієї позиції одночасно виконується не більше одного ордеру,
+    незалежні рівні та позиції виконуються паралельно.
+    :param key: Ключ рівня або позиції
+    :param execute: Функція виконання ордеру
+    :param args: Параметри функції виконання
+    :return: True, якщо намір прийнято до виконання
+    """
+    with order_intents_lock:
+        if key in order_intents:
+            return False
+        order_intents.add(key)
+
+    tick = getattr(trace_context, 'tick', 0)
+    if replay_simulation is not None:
+        run_order_intent(key, tick, simulate_order, (execute,) + args) # Симульоване виконання при відтворенні тіків
+    elif executor is None:
+        run_order_intent(key, tick, execute, args) # Виконання в поточному потоці (без пулу виконавця)
+    else:
+        executor.submit(run_order_intent, key, tick, execute, args)
+    return True
+
+def run_order_intent(key, tick, execute, args):
+    """
+    Виконання наміру розміщення ордеру з подальшим звільненням ключа рівня або позиції.
+    """
+    trace_context.tick = tick
+    try:
+        if not trading_halted:
+            execute(*args)
+    except Exception as e:
+        log(f"❌ Помилка виконання ордеру {key}: {e}")
+    finally:
+        with order_intents_lock:
+            order_intents.discard(key)
+
+def halt_trading(message):
+    """
+    Зупинка торгівлі через критичні помилки.
+    :param message: Повідомлення про причину зупинки
+    """
+    global trading_halted, accept_messages
+
+    trading_halted = True
+    accept_messages = False
+    send_telegram(message)
+    log("❌ Бот зупинено")
+
 def format_timedelta(timedelta):
     """
     Форматує timedelta об'єкт в читабельний формат.
@@ -599,16 +1647,17 @@ def format_timedelta(timedelta):
 
     return " ".join(parts)
 
-def get_next_lower_buy_level():
+def get_next_lower_buy_level(last_ticks):
     """
     Розрахунок наступного нижнього рівня купівлі.
-    :return: Розрахований рівень купівлі
+    :param last_ticks: Остання ціна (у тіках)
+    :return: Розрахований рівень купівлі (у тіках)
     """
-    # Розрахунок рівня на основі кроку та зсуву для поточної ціни
-    level = ((last_price - LEVEL_OFFSET) // LEVEL_STEP) * LEVEL_STEP + LEVEL_OFFSET
+    # Найбільший рівень сітки, не вищий за останню ціну
+    level = grid.lower(last_ticks)
 
-    # Якщо немає активних позицій, повертаємо розрахований рівень
-    if not active_positions:
+    # Якщо немає активних позицій або рівня, повертаємо розрахований рівень
+    if not active_positions or level is None:
         return level
 
     # Якщо тип сітки лінійний, повертаємо розрахований рівень
@@ -623,106 +1672,123 @@ def get_next_lower_buy_level():
             if count < curr:
                 diff = curr - prev
                 if diff > 1:
-                    p = min(active_positions, key=lambda x: float(x['price'])) # Отримуємо позицію з найменшою ціною
-                    # p_level = (float(last_position['price']) // LEVEL_STEP) * LEVEL_STEP + LEVEL_OFFSET
-                    p_level = get_nearest_level(float(p['price']), LEVEL_STEP, LEVEL_OFFSET)
-                    level = p_level - LEVEL_STEP * diff # Зсув рівня вниз
+                    p = min(active_positions, key=lambda x: x.price) # Отримуємо позицію з найменшою ціною
+                    level = grid.shift(grid.nearest(p.price), -diff) # Зсув рівня вниз
                 break
             prev = curr
 
     # Перевірка, чи є активна позиція на цьому рівні, і якщо так, зсув рівня вниз на крок
     for p in active_positions:
-        # p_level = (float(p['price']) // LEVEL_STEP) * LEVEL_STEP + LEVEL_OFFSET
-        p_level = get_nearest_level(float(p['price']), LEVEL_STEP, LEVEL_OFFSET)
-        if math.isclose(level, p_level):
-            level -= LEVEL_STEP # Зсув рівня вниз
-            # log(f"Позиція з ордером {p['order_id']} по ціні {p['price']} на рівні {p_level} вже була відкрита, зсув рівня до {level}")
+        p_level = grid.nearest(p.price)
+        if level is not None and level == p_level:
+            level = grid.shift(level, -1) # Зсув рівня вниз
+            # log(f"Позиція з ордером {p.order_id} по ціні {p.price} на рівні {p_level} вже була відкрита, зсув рівня до {level}")
             break
 
     return level
 
-def get_next_upper_buy_level():
+def get_next_upper_buy_level(last_ticks):
     """
     Розрахунок наступного верхнього рівня купівлі.
-    :return: Розрахований рівень купівлі
+    :param last_ticks: Остання ціна (у тіках)
+    :return: Розрахований рівень купівлі (у тіках)
     """
-    max_price = max([float(p['price']) for p in active_positions]) if active_positions else None
-    price = max_price if max_price else last_price - LEVEL_OFFSET
-    level = (price // LEVEL_STEP) * LEVEL_STEP + LEVEL_OFFSET + LEVEL_STEP
-
-    return level
+    # Рівень над рівнем позиції з найбільшою ціною, або найменший рівень вище останньої ціни
+    if active_positions:
+        max_price = max([p.price for p in active_positions])
+        return grid.shift(grid.nearest(max_price), 1)
 
-def get_nearest_level(price, step, offset):
-    value = price / step
-    floored = math.floor(value) * step + offset
-    ceiled = math.ceil(value) * step + offset
-    # log(f"DEBUG: price: {price}, step: {step}, value: {value}, floored: {floored}, ceiled: {ceiled}")
-    return (floored if math.fabs(price - floored) < math.fabs(price - ceiled) else ceiled)
+    return grid.upper(last_ticks)
 
-def check_and_execute_buy(current_price, lower_buy_level, upper_buy_level):
+def check_and_execute_buy(current_ticks, last_ticks, lower_buy_level, upper_buy_level):
     """
-    Перевіряє ціну та виконує купівлю, якщо ціна перетинає рівень і немає активних позицій на цьому рівні.
-    :param current_price: Поточна ціна для порівняння з рівнем купівлі
-    :param lower_buy_level: Нижній рівень купівлі
-    :param upper_buy_level: Верхній рівень купівлі
+    Перевіряє ціну та передає купівлю на виконання, якщо ціна перетинає рівень і немає активних позицій на цьому рівні.
+    :param current_ticks: Поточна ціна (у тіках) для порівняння з рівнем купівлі
+    :param last_ticks: Остання ціна (у тіках)
+    :param lower_buy_level: Нижній рівень купівлі (у тіках)
+    :param upper_buy_level: Верхній рівень купівлі (у тіках)
     """
-    global last_price, critical_buys_count, accept_messages
-
     # Визначення рівня купівлі, який було перетнуто
     level = None
-    if last_price > lower_buy_level and current_price <= lower_buy_level:
-        log(f"✋ Перетин нижнього рівня купівлі {lower_buy_level} вниз: остання ціна {last_price}, поточна ціна {current_price}")
+    if lower_buy_level is not None and last_ticks > lower_buy_level and current_ticks <= lower_buy_level:
+        log(f"✋ Перетин нижнього рівня купівлі {format_price(lower_buy_level)} вниз: остання ціна {format_price(last_ticks)}, поточна ціна {format_price(current_ticks)}")
         level = lower_buy_level
-    elif last_price < upper_buy_level and current_price >= upper_buy_level:
-        log(f"✋ Перетин верхнього рівня купівлі {upper_buy_level} вверх: остання ціна {last_price}, поточна ціна {current_price}")
+    elif upper_buy_level is not None and last_ticks < upper_buy_level and current_ticks >= upper_buy_level:
+        log(f"✋ Перетин верхнього рівня купівлі {format_price(upper_buy_level)} вверх: остання ціна {format_price(last_ticks)}, поточна ціна {format_price(current_ticks)}")
         level = upper_buy_level
     else:
         return # Рівень купівлі не перетнуто
 
-    # Вивід активних позицій
-    if active_positions:
-        log(f"✨ Активні позиції ({len(active_positions)} шт): {active_positions}")
-    else:
-        log("✨ Активних позицій немає")
+    # Вивід активних позицій (коротко, щоб обсяг логу не зростав разом з кількістю позицій)
+    log(format_positions_summary())
 
     # Перевірка, чи є активна позиція на цьому рівні
     for p in active_positions:
-        # p_level = (float(p['price']) // LEVEL_STEP) * LEVEL_STEP + LEVEL_OFFSET
-        p_level = get_nearest_level(float(p['price']), LEVEL_STEP, LEVEL_OFFSET)
-        log(f"❔ Перевірка позиції з ордером {p['order_id']} по ціні {p['price']} на рівні {p_level}")
-        if math.isclose(level, p_level):
-            log(f"⚠️ Позиція з ордером {p['order_id']} по ціні {p['price']} на рівні {p_level} вже була відкрита {p['date']}")
+        p_level = grid.nearest(p.price)
+        if level == p_level:
+            log(f"⚠️ Позиція з ордером {p.order_id} по ціні {format_price(p.price)} на рівні {format_price(p_level)} вже була відкрита {p.date}")
             return
-    log(f"✋ Позицій на рівні {level} не знайдено")
+    log(f"✋ Позицій на рівні {format_price(level)} не знайдено")
+
+    submit_order_intent(f"LEVEL_{level}", execute_buy, level, new_execution("Buy", current_ticks / price_factor, level / price_factor))
+
+def execute_buy(level, execution=None):
+    """
+    Виконує купівлю на рівні та очікує підтвердження виконання (в потоці виконавця ордерів).
+    :param level: Рівень купівлі (у тіках)
+    :param execution: Запис якості виконання, створений при прийнятті рішення
+    """
+    global critical_buys_count
 
+    execution = execution or new_execution("Buy", last_price, level / price_factor)
     try:
-        log(f"⚽ Спроба купівлі на рівні {level}...")
-        order = session.place_order(
-            category="spot",
-            symbol=SYMBOL,
-            side="Buy",
-            orderType="Market",
-            qty=str(ORDER_SIZE), # Вказується в котирувальній монеті
-            orderLinkId=f"BOT_{''.join(random.choices(string.digits, k=20))}"
-        )
+        armed = take_armed_order(f"LEVEL_{level}")
+        if armed:
+            # Розміщення підготовленого ордеру
+            log(f"⚽ Спроба купівлі на рівні {format_price(level)} підготовленим ордером...")
+            with trace_span("place_order", side="Buy", armed=True):
+                execution['send_time'] = time.time() * 1000
+                order = rest_call(RestPriority.ORDER, send_armed_order, armed=armed)
+                record_ack(execution, order)
+        else:
+            log(f"⚽ Спроба купівлі на рівні {format_price(level)}...")
+            with trace_span("place_order", side="Buy"):
+                execution['send_time'] = time.time() * 1000
+                order = rest_call(
+                    RestPriority.ORDER,
+                    session.place_order,
+                    category="spot",
+                    symbol=SYMBOL,
+                    side="Buy",
+                    orderType="Market",
+                    qty=str(ORDER_SIZE), # Вказується в котирувальній монеті
+                    orderLinkId=f"BOT_{''.join(random.choices(string.digits, k=20))}"
+                )
+                record_ack(execution, order)
         if order.get('retCode') != 0:
             log(f"❌ Помилка розміщення ордеру: {order.get('retMsg')}")
+            record_execution(execution, status="Error")
             return
 
         order_id = order['result']['orderId']
+        execution['order_id'] = order_id
         log(f"⛵ Ордер на покупку {order_id} розміщено. Очікування виконання...")
         is_filled = False
+        fill_start_ns = time.time_ns()
 
         # Перевірка статусу
         for i in range(RETRY_COUNT):
             time.sleep(RETRY_DELAY_SECONDS) # Затримка перед перевіркою
 
             log(f"⛽ Отримання історії ордерів для ордеру на покупку {order_id}...")
-            history = session.get_order_history(
-                category="spot",
-                symbol=SYMBOL,
-                orderId=order_id
-            )
+            with trace_span("get_order_history", side="Buy"):
+                history = rest_call(
+                    RestPriority.FILL,
+                    session.get_order_history,
+                    category="spot",
+                    symbol=SYMBOL,
+                    orderId=order_id
+                )
             if history.get('retCode') != 0:
                 log(f"❌ Помилка отримання історії ордерів: {history.get('retMsg')} (спроба {i+1} з {RETRY_COUNT})")
                 continue
@@ -739,7 +1805,10 @@ def check_and_execute_buy(current_price, lower_buy_level, upper_buy_level):
 
             # Перевіряємо статус ордера
             status = order_data['orderStatus']
+            execution['status'] = status
             if status == "Filled":
+                execution['fill_time'] = int(order_data.get('updatedTime') or time.time() * 1000)
+                execution['fill_price'] = float(order_data.get('avgPrice') or 0) or None
                 log(f"✅ Ордер на покупку {order_data['orderId']} виконано")
                 log(f"➡️ Поки ордер на покупку {order_id} не буде підтверджено, серед активних позицій може показуватись невірна інформація")
 
@@ -747,20 +1816,20 @@ def check_and_execute_buy(current_price, lower_buy_level, upper_buy_level):
                 load_positions()
 
                 # Отримуємо реальні дані виконання
-                pos = next((p for p in active_positions if p['order_id'] == order_data['orderId']), None)
+                pos = next((p for p in active_positions if p.order_id == order_data['orderId']), None)
                 if not pos:
                     log(f"❌ Виконаний ордер на покупку {order_data['orderId']} не знайдено серед активних позицій (спроба {i+1} з {RETRY_COUNT})")
                     continue
                 log(f"➡️ Виконаний ордер на покупку {order_data['orderId']} знайдено серед активних позицій")
 
-                price = float(pos['price'])
-                qty = float(pos['qty'])
-                fee = float(pos['fee'])
+                price = pos.price / price_factor
+                qty = pos.qty / qty_factor
+                fee = pos.fee / qty_factor
 
                 message = f"⛺ Куплено {format(qty, f'.{base_precision}f')} {base_coin} по ціні {format(price, '.2f')} {quote_coin},"
                 message += f" що становить {format(qty * price, '.2f')} {quote_coin}."
                 message += f" Додатково комісія склала {format(fee * price, '.2f')} {quote_coin}."
-                message += f" Ордер на покупку {pos['order_id']} було розміщено {pos['date']}."
+                message += f" Ордер на покупку {pos.order_id} було розміщено {pos.date}."
                 log(message)
 
                 # Записуємо в лог-файл
@@ -778,6 +1847,13 @@ def check_and_execute_buy(current_price, lower_buy_level, upper_buy_level):
                 log(f"❎ Ордер {order_data['orderId']} не виконано, статус: {status} (спроба {i+1} з {RETRY_COUNT})")
                 continue
 
+        # Запис якості виконання ордеру
+        record_execution(execution)
+
+        # Трасування підтвердження виконання
+        if TRACE_ENABLED:
+            trace_event("fill_confirm", fill_start_ns, time.time_ns(), {"tick": getattr(trace_context, 'tick', 0), "side": "Buy", "filled": is_filled})
+
         if not is_filled:
             log(f"❎ Ордер {order_data['orderId']} розміщено, але статус 'Filled' не підтверджено")
 
@@ -788,20 +1864,432 @@ def check_and_execute_buy(current_price, lower_buy_level, upper_buy_level):
         # Збільшуємо лічильник критичних помилок і завершуємо роботу, якщо досягнуто ліміт
         critical_buys_count += 1
         if critical_buys_count >= RETRY_COUNT:
-            accept_messages = False
-            send_telegram(f"❌ Критична помилка при купівлі, бот зупинено: {e}")
-            log("❌ Бот зупинено")
-            sys.exit(1)
+            halt_trading(f"❌ Критична помилка при купівлі, бот зупинено: {e}")
+            return
 
         time.sleep(RETRY_DELAY_SECONDS) # Затримка перед можливою повторною спробою
         log("⚠️ Додатково відновлюємо позиції...")
         load_positions()
 
+def load_shadow_grids():
+    """
+    Завантаження конфігурацій тіньових сіток з файлу.
+    Файл містить список конфігурацій або словник зі списками значень параметрів (усі комбінації).
+    Відсутні параметри беруться з живої конфігурації, яка завжди симулюється першою.
+    """
+    global shadow_grids
+
+    live = {"GRID_TYPE": GRID_TYPE, "LEVEL_STEP": LEVEL_STEP, "LEVEL_OFFSET": LEVEL_OFFSET, "LEVEL_STEP_PERCENT": LEVEL_STEP_PERCENT, "PROFIT_TARGET": PROFIT_TARGET}
+
+    try:
+        with open(SHADOW_GRIDS_FILE, "r") as f:
+            spec = json.load(f)
+    except Exception as e:
+        log(f"❌ Помилка завантаження тіньових сіток з файлу {SHADOW_GRIDS_FILE}: {e}")
+        return
+
+    if isinstance(spec, dict):
+        keys = list(spec.keys())
+        spec = [dict(zip(keys, values)) for values in itertools.product(*(spec[k] if isinstance(spec[k], list) else [spec[k]] for k in keys))]
+
+    configs = [live]
+    for item in spec:
+        config = dict(live)
+        try:
+            for key, value in item.items():
+                config[key.upper()] = GridType[value.upper()] if key.upper() == "GRID_TYPE" else float(value)
+
+            # Перевірка параметрів сітки тими ж правилами, що й для живої сітки (рівні з файлу перевіряються нижче)
+            if config['GRID_TYPE'] != GridType.CUSTOM:
+                Grid(config['GRID_TYPE'], to_ticks(config['LEVEL_STEP']), to_ticks(config['LEVEL_OFFSET']), config['LEVEL_STEP_PERCENT'])
+        except (KeyError, ValueError) as e:
+            log(f"⚠️ Тіньову сітку {item} пропущено: {e}")
+            continue
+        if config != live:
+            configs.append(config)
+
+    # Рівні з файлу спільні для всіх конфігурацій сітки з файлу
+    levels = None
+    if any(c['GRID_TYPE'] == GridType.CUSTOM for c in configs):
+        try:
+            levels = load_grid_levels()
+        except Exception as e:
+            log(f"❌ Помилка завантаження рівнів сітки з файлу {LEVELS_FILE}: {e}")
+            return
+        if not levels:
+            log(f"❌ Список рівнів сітки у файлі {LEVELS_FILE} порожній")
+            return
+
+    shadow_grids = ShadowGrids(configs, levels)
+    log(f"➗ Тіньові сітки завантажено ({len(configs)} конфігурацій)")
+
+def process_shadow_grids(current_price):
+    """
+    Обробка тіку тіньовими сітками та періодичний звіт.
+    :param current_price: Поточна ціна
+    """
+    global shadow_report_time
+
+    try:
+        with trace_span("shadow_grids"):
+            shadow_grids.process(current_price)
+
+        now = time.monotonic()
+        if not shadow_report_time:
+            shadow_report_time = now
+        elif now - shadow_report_time >= 60 * SHADOW_REPORT_INTERVAL_MINS:
+            log(shadow_grids.report())
+            shadow_report_time = now
+    except Exception as e:
+        log(f"❌ Помилка симуляції тіньових сіток: {e}")
+
+def normalize_tick(message):
+    """
+    Нормалізація повідомлення стріму тікерів.
+    :param message: Повідомлення
+    :return: Тік (час, остання ціна, об'єм)
+    """
+    data = message['data']
+    return (
+        int(message.get('ts', 0)),
+        float(data['lastPrice']),
+        float(data.get('volume24h', 'nan'))
+    )
+
+def run_feed():
+    """
+    Постачальник ринкових даних: одне підключення до біржі, що записує нормалізовані тіки
+    у спільний кільцевий буфер для процесів ботів (MARKET_FEED=SHARED).
+    """
+    log(f"⚪ Постачальник ринкових даних запущено")
+
+    ring = TickRing.create(FEED_RING_NAME, FEED_RING_CAPACITY)
+    log(f"⚙️ Спільний буфер тіків {FEED_RING_NAME} створено (ємність {FEED_RING_CAPACITY})")
+
+    def publish_message(message):
+        if 'data' in message:
+            try:
+                ring.publish(normalize_tick(message))
+            except (KeyError, ValueError):
+                pass # Ігноруємо неочікувані повідомлення
+
+    try:
+        while True:
+            try:
+                log("⛅ Підписка на стрім тікерів ", end="")
+                ws = WebSocket(testnet=False, channel_type="spot")
+                ws.ticker_stream(symbol=SYMBOL, callback=publish_message)
+                log("виконано успішно", datetime_prefix=False)
+
+                # Утримання програми в активному стані
+                while True:
+                    time.sleep(1)
+
+            except KeyboardInterrupt:
+                log("⚠️ Отримано сигнал зупинки від користувача")
+                return
+
+            except Exception as e:
+                log(f"❌ Помилка веб-сокета: {e}")
+                log("⚠️ Пеезапуск веб-сокета")
+
+                # Очікування перед перезапуском
+                time.sleep(5)
+    finally:
+        ring.close()
+        log("⚫ Постачальник ринкових даних зупинено")
+        log(empty_line=True, console_output=False)
+
+def decode_raw_ticker(text):
+    """
+    Легке декодування повідомлення стріму тікерів: потрібні поля вибираються з тексту повідомлення
+    без повного розбору JSON (об'єм декодується лише при записі тіків).
+    :param text: Текст повідомлення
+    :return: Тік (час, остання ціна, об'єм) або None для службових повідомлень
+    :raises ValueError: Неочікуваний формат повідомлення
+    """
+    start = text.find('"lastPrice":"')
+    if start < 0:
+        return None # Відповіді на підписку та ping
+    start += 13
+    last = float(text[start:text.index('"', start)])
+
+    ts = 0
+    start = text.find('"ts":')
+    if start >= 0:
+        start += 5
+        end = text.find(',', start)
+        if end < 0:
+            end = text.index('}', start) # Час - останнє поле повідомлення
+        ts = int(text[start:end])
+
+    volume = math.nan
+    if TICK_RECORDING:
+        start = text.find('"volume24h":"')
+        if start >= 0:
+            start += 13
+            volume = float(text[start:text.index('"', start)])
+
+    return (ts, last, volume)
+
+def read_raw_feed(stop_event):
+    """
+    Легкий клієнт WebSocket стріму тікерів (без обробника pybit): повідомлення декодуються в потоці читання
+    і передаються в чергу обробки як тіки, тіки без зміни ціни відкидаються до черги.
+    """
+    while not stop_event.is_set():
+        ws = None
+        try:
+            log("⛅ Підписка на стрім тікерів (легкий клієнт) ", end="")
+            ws = websocket.create_connection(RAW_FEED_URL, timeout=RAW_FEED_TIMEOUT_SECONDS)
+            ws.send(json.dumps({"op": "subscribe", "args": [f"tickers.{SYMBOL}"]}))
+            log("виконано успішно", datetime_prefix=False)
+
+            ping_time = time.monotonic()
+            while not stop_event.is_set():
+                # Утримання підключення
+                if time.monotonic() - ping_time >= RAW_FEED_PING_SECONDS:
+                    ws.send('{"op":"ping"}')
+                    ping_time = time.monotonic()
+
+                try:
+                    text = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                received_ns = time.time_ns() if TRACE_ENABLED else 0
+
+                try:
+                    tick = decode_raw_ticker(text)
+                except ValueError:
+                    continue # Ігноруємо неочікувані повідомлення (як обробник повідомлень pybit)
+                if tick is not None:
+                    handle_tick(tick, received_ns)
+                elif '"success":false' in text:
+                    log(f"❌ Помилка підписки на стрім тікерів: {text}")
+        except Exception as e:
+            log(f"❌ Помилка веб-сокета: {e}")
+            log("⚠️ Пеезапуск веб-сокета")
+
+            # Очікування перед перезапуском
+            stop_event.wait(5)
+        finally:
+            if ws is not None:
+                ws.close()
+
+def read_shared_feed(stop_event):
+    """
+    Читання тіків зі спільного кільцевого буфера постачальника ринкових даних.
+    Пропуски в номерах тіків логуються, при зупинці постачальника виконується перепідключення.
+    """
+    ring = None
+    last_tick_time = 0
+
+    while not stop_event.is_set():
+        # Підключення до спільного буфера
+        if ring is None:
+            try:
+                ring = TickRing.attach(FEED_RING_NAME)
+                last_tick_time = time.monotonic()
+                log(f"⛅ Підключено до спільного буфера тіків {FEED_RING_NAME}")
+            except FileNotFoundError:
+                log(f"⚠️ Спільний буфер тіків {FEED_RING_NAME} не знайдено, запустіть постачальника: python main.py feed")
+                stop_event.wait(5)
+                continue
+
+        tick, missed = ring.read()
+        if missed:
+            log(f"⚠️ Пропущено {missed} тіків зі спільного буфера")
+
+        if tick is None:
+            # Перепідключення, якщо постачальника перезапущено або тіки давно не надходили
+            if ring.is_stale() or time.monotonic() - last_tick_time > FEED_STALE_SECONDS:
+                log("⚠️ Спільний буфер тіків неактивний, перепідключення...")
+                ring.close()
+                ring = None
+                continue
+            time.sleep(FEED_POLL_INTERVAL_SECONDS)
+            continue
+
+        last_tick_time = time.monotonic()
+        handle_tick(tick, time.time_ns() if TRACE_ENABLED else 0)
+
+    if ring is not None:
+        ring.close()
+
+def record_tick(tick):
+    """
+    Запис тіку у бінарний файл фіксованого формату (окремий файл на кожен день UTC).
+    :param tick: Тік (час, остання ціна, об'єм)
+    """
+    global tick_record_file, tick_record_day
+
+    ts = tick[0] or int(time.time() * 1000)
+    day = ts // MS_IN_DAY
+
+    with tick_record_lock:
+        # Перехід до файлу нового дня
+        if day != tick_record_day:
+            if tick_record_file is not None:
+                tick_record_file.close()
+            os.makedirs(TICKS_DIR, exist_ok=True)
+            path = os.path.join(TICKS_DIR, f"{SYMBOL}_{time.strftime('%Y%m%d', time.gmtime(day * MS_IN_DAY // 1000))}.bin")
+            tick_record_file = open(path, "ab")
+            tick_record_day = day
+            log(f"⚙️ Запис тіків у файл {path}")
+
+        tick_record_file.write(TICK_RECORD.pack(ts, *tick[1:]))
+
+def close_tick_recording():
+    """
+    Закриття файлу запису тіків.
+    """
+    global tick_record_file, tick_record_day
+
+    with tick_record_lock:
+        if tick_record_file is not None:
+            tick_record_file.close()
+            tick_record_file = None
+            tick_record_day = None
+
+def read_recorded_ticks(paths):
+    """
+    Читання записаних тіків з бінарних файлів через відображення файлів у пам'ять.
+    Шлях до каталогу означає усі файли тіків символу в ньому.
+    :param paths: Шляхи до файлів або каталогів
+    :return: Генератор тіків (час, остання ціна, об'єм)
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.startswith(f"{SYMBOL}_") and f.endswith(".bin")))
+        else:
+            files.append(path)
+
+    for path in files:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            size -= size % TICK_RECORD.size # Неповний останній запис ігнорується
+            if size == 0:
+                continue
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)[:size]
+                try:
+                    yield from TICK_RECORD.iter_unpack(view)
+                finally:
+                    view.release()
+
+def replay_ticks(ticks, speed=None):
+    """
+    Відтворення тіків з початковими інтервалами між ними.
+    :param ticks: Тіки (час, остання ціна, об'єм)
+    :param speed: Прискорення відтворення (1 - оригінальна швидкість, None - максимальна швидкість)
+    :return: Генератор тіків
+    """
+    first_ts = None
+    start_time = time.monotonic()
+
+    for tick in ticks:
+        if speed:
+            if first_ts is None:
+                first_ts = tick[0]
+            delay = (tick[0] - first_ts) / 1000 / speed - (time.monotonic() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+        yield tick
+
+def run_replay(args):
+    """
+    Відтворення записаних тіків через process_data з симульованим виконанням ордерів за ціною тіку.
+    Ордери на біржу не надсилаються, файли стану бота не змінюються, відтворення починається без позицій.
+    :param args: Шляхи до файлів або каталогів тіків та необов'язковий параметр --speed=<прискорення|max>
+    """
+    global session, active_positions, replay_simulation
+
+    speed = 1.0
+    paths = []
+    for arg in args:
+        if arg.startswith("--speed="):
+            value = arg.split("=", 1)[1].lower()
+            speed = None if value == "max" else float(value)
+        else:
+            paths.append(arg)
+
+    if not paths:
+        paths = [TICKS_DIR]
+
+    log(f"⚪ Відтворення тіків запущено (швидкість: {f'x{speed:g}' if speed else 'максимальна'})")
+
+    session = create_session()
+    load_instruments_info()
+    load_grid()
+
+    # Симульоване виконання ордерів замість біржі
+    active_positions = []
+    replay_simulation = {"orders": 0, "buys": 0, "sells": 0, "realized": 0.0, "time": 0}
+
+    count = 0
+    try:
+        for tick in replay_ticks(read_recorded_ticks(paths), speed):
+            replay_simulation['time'] = tick[0]
+            process_data(tick)
+            count += 1
+    except KeyboardInterrupt:
+        log("⚠️ Отримано сигнал зупинки від користувача")
+
+    # Підсумок симуляції (нереалізований прибуток за останньою ціною)
+    unrealized = sum(p.qty / qty_factor * (last_price - p.price / price_factor) for p in active_positions)
+    message = f"⚫ Відтворення тіків завершено ({count} шт):"
+    message += f" купівель {replay_simulation['buys']}, продажів {replay_simulation['sells']}, позицій {len(active_positions)},"
+    message += f" прибуток реалізований {replay_simulation['realized']:.2f}, нереалізований {unrealized:.2f} {quote_coin}"
+    log(message)
+
+def simulate_order(execute, *args):
+    """
+    Симульоване виконання ордеру при відтворенні тіків: виконання за ціною тіку, як у тіньових сітках,
+    без біржі та без запису у файли стану (позиції, історія, журнали угод та якості виконання).
+    Якщо в стані симуляції задано файл історії (тривала симуляція), угоди дописуються в нього як у файл історії бота.
+    :param execute: Функція виконання ордеру (execute_buy або execute_sell)
+    :param args: Параметри функції виконання
+    """
+    global active_positions
+
+    simulation = replay_simulation
+    date = datetime.fromtimestamp(simulation['time'] / 1000).strftime("%Y-%m-%d %H:%M:%S")
+
+    if execute is execute_buy:
+        level, execution = args
+        price = to_ticks(execution['trigger_price'])
+        simulation['orders'] += 1
+        simulation['buys'] += 1
+        pos = Position(f"SIM_{simulation['orders']}", date, "Buy", price, to_units(ORDER_SIZE / (price / price_factor)), 0)
+        with active_positions_lock:
+            active_positions = sorted(active_positions + [pos], key=lambda x: x.price, reverse=True)
+        trade = {"orderId": pos.order_id, "orderLinkId": f"BOT_{simulation['orders']}", "side": "Buy", "avgPrice": format_price(price), "cumExecQty": format_qty(pos.qty)}
+        log(f"⛺ Симульовано купівлю {format_qty(pos.qty)} {base_coin} по ціні {format_price(price)} на рівні {format_price(level)}")
+    else:
+        pos, current_price, _ = args
+        profit = (current_price - pos.price / price_factor) * pos.qty / qty_factor
+        simulation['sells'] += 1
+        simulation['realized'] += profit
+        with active_positions_lock:
+            active_positions = [p for p in active_positions if p is not pos]
+        simulation['orders'] += 1
+        trade = {"orderId": f"SIM_{simulation['orders']}", "orderLinkId": f"BUY_{pos.order_id}", "side": "Sell", "avgPrice": format_price(to_ticks(current_price)), "cumExecQty": format_qty(pos.qty)}
+        log(f"⚽ Симульовано продаж позиції {pos.order_id} по ціні {current_price:.2f}, прибуток {profit:.2f} {quote_coin}")
+
+    if simulation.get('history') is not None:
+        trade.update(createdTime=str(simulation['time']), cumFeeDetail={})
+        simulation['history'].write(json.dumps(compact_history_order(trade)) + "\n")
+
 def log(message="", end="\n", flush=False, empty_line=False, datetime_prefix=True, console_output=True, file_output=True):
     """
     Логування роботи бота.
     :param message: Текст логування
     """
+    if log_muted:
+        return
+
     # Формування тексту для логування
     if not empty_line and datetime_prefix:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -818,27 +2306,376 @@ def log(message="", end="\n", flush=False, empty_line=False, datetime_prefix=Tru
             if flush:
                 f.flush()
 
-def log_trade(pos, action, exec_price, profit=None):
+def trace_span(name, **args):
+    """
+    Створення інтервалу трасування для тіку, що обробляється.
+    :param name: Назва інтервалу
+    :param args: Додаткові дані інтервалу
+    :return: Контекстний менеджер інтервалу (порожній, якщо трасування вимкнено)
+    """
+    if not TRACE_ENABLED:
+        return NO_TRACE
+
+    args["tick"] = getattr(trace_context, 'tick', 0)
+    return TraceSpan(name, args)
+
+def trace_event(name, start_ns, end_ns, args=None):
+    """
+    Запис завершеного інтервалу у файл трасування (формат Chrome Trace Event).
+    Файл можна відкрити в chrome://tracing або https://ui.perfetto.dev.
+    :param name: Назва інтервалу
+    :param start_ns: Час початку (наносекунди)
+    :param end_ns: Час завершення (наносекунди)
+    :param args: Додаткові дані інтервалу
+    """
+    global trace_file
+
+    event = {
+        "name": name,
+        "cat": "gridmaton",
+        "ph": "X",
+        "ts": start_ns // 1000,
+        "dur": (end_ns - start_ns) // 1000,
+        "pid": os.getpid(),
+        "tid": threading.get_native_id(),
+        "args": args or {}
+    }
+    line = json.dumps(event, ensure_ascii=False)
+
+    with trace_lock:
+        if trace_file is None:
+            # Масив подій без закриваючої дужки є допустимим форматом для переглядачів трасування
+            is_new = not os.path.exists(TRACE_FILE) or os.path.getsize(TRACE_FILE) == 0
+            trace_file = open(TRACE_FILE, "a", encoding="utf-8")
+            if is_new:
+                trace_file.write("[\n")
+        trace_file.write(line + ",\n")
+
+def flush_trace(close=False):
+    """
+    Скидання буфера файлу трасування на диск.
+    :param close: Закрити файл трасування
+    """
+    global trace_file
+
+    with trace_lock:
+        if trace_file is None:
+            return
+        trace_file.flush()
+        if close:
+            trace_file.close()
+            trace_file = None
+
+def log_trade(pos, action, exec_price, profit=None, exec_time=None):
     """
     Уніфіковане логування операцій купівлі та продажу.
     :param pos: Дані позиції
     :param action: 'BUY' або 'SELL'
     :param exec_price: Ціна виконання
     :param profit: Прибуток (тільки для SELL)
+    :param exec_time: Час виконання (за замовчуванням поточний час)
     """
+    exec_time = exec_time or datetime.now()
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # Формуємо базову частину повідомлення
-    message = f"[{timestamp}] {action.upper()}{' ' if action.upper() == 'BUY' else ''} | {SYMBOL} | Price: {exec_price:.2f} | Qty: {pos['qty']}"
+    message = f"[{timestamp}] {action.upper()}{' ' if action.upper() == 'BUY' else ''} | {SYMBOL} | Price: {exec_price:.2f} | Qty: {format_qty(pos.qty)}"
 
     # Якщо це продаж, додаємо ціну купівлі та профіт
     if action.upper() == "SELL":
-        message += f" | BuyPrice: {pos['price']} | Profit: {profit:.4f}"
+        message += f" | BuyPrice: {format_price(pos.price)} | Profit: {profit:.4f}"
 
     # Запис у файл
     with open(TRADE_LOG_FILE, "a", encoding="utf-8") as f:
         f.write(message + "\n")
 
+    # Запис у журнал угод
+    hold_seconds = None
+    if action.upper() == "SELL":
+        hold_seconds = int((exec_time - datetime.strptime(pos.date, '%Y-%m-%d %H:%M:%S')).total_seconds())
+    record_ledger({
+        "time": exec_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "action": action.upper(),
+        "symbol": SYMBOL,
+        "order_id": pos.order_id,
+        "price": exec_price,
+        "qty": pos.qty / qty_factor,
+        "buy_price": pos.price / price_factor,
+        "profit": profit,
+        "hold_seconds": hold_seconds
+    })
+
+def new_ledger_stats():
+    """
+    Створення порожньої накопичувальної статистики журналу угод.
+    :return: Статистика журналу угод
+    """
+    return {
+        "ledger_size": 0, # Розмір файлу журналу, врахований у статистиці (у байтах)
+        "buys": 0,
+        "sells": 0,
+        "wins": 0,
+        "realized": 0.0,
+        "hold_seconds": 0,
+        "bought_value": 0.0,
+        "sold_value": 0.0,
+        "daily": {},
+        "weekly": {},
+        "monthly": {}
+    }
+
+def apply_ledger_entry(stats, entry):
+    """
+    Оновлення накопичувальної статистики одним записом журналу угод (O(1)).
+    :param stats: Статистика журналу угод
+    :param entry: Запис журналу угод
+    """
+    value = entry['price'] * entry['qty']
+    if entry['action'] == "BUY":
+        stats['buys'] += 1
+        stats['bought_value'] += value
+        return
+
+    profit = entry['profit'] or 0.0
+    stats['sells'] += 1
+    stats['sold_value'] += value
+    stats['realized'] += profit
+    stats['hold_seconds'] += entry['hold_seconds'] or 0
+    if profit > 0:
+        stats['wins'] += 1
+
+    # Прибуток за день, тиждень та місяць
+    exec_time = datetime.strptime(entry['time'], '%Y-%m-%d %H:%M:%S')
+    for period, key in (("daily", exec_time.strftime("%Y-%m-%d")), ("weekly", exec_time.strftime("%G-W%V")), ("monthly", exec_time.strftime("%Y-%m"))):
+        stats[period][key] = stats[period].get(key, 0.0) + profit
+
+def load_ledger(save=True):
+    """
+    Завантаження накопичувальної статистики журналу угод.
+    Обробляються лише записи журналу, що не були враховані у збереженій статистиці.
+    :param save: Збереження оновленої статистики у файл
+    """
+    global ledger_stats
+
+    with ledger_lock:
+        stats = None
+        if os.path.exists(LEDGER_STATS_FILE):
+            try:
+                with open(LEDGER_STATS_FILE, "r") as f:
+                    stats = json.load(f)
+            except Exception as e:
+                log(f"❌ Помилка завантаження статистики журналу угод: {e}")
+        if not stats:
+            stats = new_ledger_stats()
+
+        # Дочитування записів журналу, доданих після збереження статистики
+        ledger_size = os.path.getsize(LEDGER_FILE) if os.path.exists(LEDGER_FILE) else 0
+        if ledger_size < stats['ledger_size']:
+            log("⚠️ Журнал угод змінено, статистику буде перераховано")
+            stats = new_ledger_stats()
+        if ledger_size > stats['ledger_size']:
+            count = 0
+            with open(LEDGER_FILE, "r", encoding="utf-8") as f:
+                f.seek(stats['ledger_size'])
+                for line in f:
+                    if line.strip():
+                        apply_ledger_entry(stats, json.loads(line))
+                        count += 1
+            stats['ledger_size'] = ledger_size
+            if save:
+                save_ledger_stats(stats)
+            log(f"⚓ Статистику журналу угод оновлено ({count} записів)")
+
+        ledger_stats = stats
+
+def save_ledger_stats(stats):
+    """
+    Збереження накопичувальної статистики журналу угод у файл (контрольна точка).
+    Прибуток за днями та тижнями зберігається лише за останні періоди, тож розмір файлу обмежений.
+    :param stats: Статистика журналу угод
+    """
+    global ledger_unsaved
+
+    now = datetime.now()
+    for period, oldest in (("daily", (now - timedelta(days=LEDGER_KEEP_DAYS)).strftime("%Y-%m-%d")), ("weekly", (now - timedelta(weeks=LEDGER_KEEP_WEEKS)).strftime("%G-W%V"))):
+        for key in [k for k in stats[period] if k < oldest]:
+            del stats[period][key]
+
+    with open(LEDGER_STATS_FILE, "w") as f:
+        json.dump(stats, f)
+    ledger_unsaved = 0
+
+def flush_ledger():
+    """
+    Збереження статистики журналу угод, якщо є записи, не враховані в останній контрольній точці.
+    """
+    with ledger_lock:
+        if ledger_stats is not None and ledger_unsaved:
+            save_ledger_stats(ledger_stats)
+
+def record_ledger(entry):
+    """
+    Запис угоди в журнал угод та оновлення накопичувальної статистики.
+    Статистика зберігається у файл періодично (записи після контрольної точки дочитуються з журналу при запуску).
+    :param entry: Запис журналу угод
+    """
+    global ledger_unsaved
+
+    if ledger_stats is None:
+        load_ledger()
+
+    with ledger_lock:
+        with open(LEDGER_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        apply_ledger_entry(ledger_stats, entry)
+        ledger_stats['ledger_size'] = os.path.getsize(LEDGER_FILE)
+        ledger_unsaved += 1
+        if ledger_unsaved >= LEDGER_CHECKPOINT_ENTRIES:
+            save_ledger_stats(ledger_stats)
+
+def new_execution(side, trigger_price, level):
+    """
+    Створення запису якості виконання ордеру в момент прийняття рішення.
+    :param side: 'Buy' або 'Sell'
+    :param trigger_price: Ціна, при якій було прийнято рішення
+    :param level: Перетнутий рівень купівлі або рівень продажу
+    :return: Запис якості виконання
+    """
+    return {
+        "side": side,
+        "level": level,
+        "trigger_time": time.time() * 1000,
+        "trigger_price": trigger_price,
+        "volatility_bps": volatility_bps,
+        "send_time": None,
+        "ack_time": None,
+        "exchange_ack_time": None,
+        "order_id": None,
+        "status": None,
+        "fill_time": None,
+        "fill_price": None
+    }
+
+def record_ack(execution, order):
+    """
+    Фіксація підтвердження ордеру: локальний час та час біржі з відповіді на створення ордеру (у мілісекундах).
+    :param execution: Запис якості виконання
+    :param order: Відповідь API на створення ордеру
+    """
+    execution['ack_time'] = time.time() * 1000
+    execution['exchange_ack_time'] = int(order['time']) if order.get('time') else None
+
+def record_execution(execution, status=None):
+    """
+    Запис якості виконання ордеру в журнал.
+    Час рішення, відправки та підтвердження – локальний, час підтвердження біржею – з відповіді на створення ордеру,
+    час виконання – з історії ордерів біржі (у мілісекундах).
+    :param execution: Запис якості виконання
+    :param status: Статус ордеру (якщо не отримано з історії ордерів)
+    """
+    if status:
+        execution['status'] = status
+    with executions_lock:
+        with open(EXECUTIONS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(execution) + "\n")
+
+def format_execution_report(executions):
+    """
+    Формування звіту якості виконання: перцентилі затримок та прослизання (у базисних пунктах)
+    загалом, за годинами та за режимами волатильності.
+    :param executions: Записи якості виконання
+    :return: Текст звіту
+    """
+    def percentiles(values, unit):
+        if not values:
+            return "немає даних"
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return f"p50 {p50:.1f} / p90 {p90:.1f} / p99 {p99:.1f} {unit}"
+
+    def slippage(e):
+        # Додатне прослизання – виконання гірше за ціну прийняття рішення
+        diff = e['fill_price'] - e['trigger_price'] if e['side'] == "Buy" else e['trigger_price'] - e['fill_price']
+        return diff / e['trigger_price'] * 10000
+
+    def summary(group):
+        latency = percentiles([e['fill_time'] - e['trigger_time'] for e in group], "мс")
+        slips = [slippage(e) for e in group]
+        return f"{len(group)} шт, рішення → виконання {latency}, прослизання середнє {np.mean(slips):.2f} бп, {percentiles(slips, 'бп')}"
+
+    acked = [e for e in executions if e.get('ack_time')]
+    filled = [e for e in acked if e.get('fill_time') and e.get('fill_price')]
+
+    message = "⚙️ Якість виконання ордерів:\n"
+    message += f"Ордерів: {len(executions)} (підтверджено біржею {len(acked)}, виконано {len(filled)})\n"
+    message += f"Рішення → відправка: {percentiles([e['send_time'] - e['trigger_time'] for e in acked], 'мс')}\n"
+    message += f"Відправка → підтвердження: {percentiles([e['ack_time'] - e['send_time'] for e in acked], 'мс')}\n"
+    message += f"Відправка → підтвердження (час біржі): {percentiles([e['exchange_ack_time'] - e['send_time'] for e in acked if e.get('exchange_ack_time')], 'мс')}\n"
+    message += f"Рішення → виконання: {percentiles([e['fill_time'] - e['trigger_time'] for e in filled], 'мс')}\n"
+    if not filled:
+        return message + "Прослизання: немає даних"
+    slips = [slippage(e) for e in filled]
+    message += f"Прослизання: середнє {np.mean(slips):.2f} бп, {percentiles(slips, 'бп')}\n"
+
+    # За годинами (локальний час прийняття рішення)
+    message += "\nЗа годинами:\n"
+    hours = {}
+    for e in filled:
+        hours.setdefault(datetime.fromtimestamp(e['trigger_time'] / 1000).hour, []).append(e)
+    for hour in sorted(hours):
+        message += f"{hour:02d}:00 – {summary(hours[hour])}\n"
+
+    # За режимами волатильності (терцилі волатильності в момент прийняття рішення)
+    message += "\nЗа волатильністю:\n"
+    low, high = np.percentile([e['volatility_bps'] for e in filled], [100 / 3, 200 / 3])
+    regimes = (
+        (f"низька (≤ {low:.2f} бп)", lambda v: v <= low),
+        (f"середня ({low:.2f}–{high:.2f} бп)", lambda v: low < v <= high),
+        (f"висока (> {high:.2f} бп)", lambda v: v > high)
+    )
+    for name, matches in regimes:
+        group = [e for e in filled if matches(e['volatility_bps'])]
+        if group:
+            message += f"{name} – {summary(group)}\n"
+
+    return message.rstrip("\n")
+
+def format_ledger_stats():
+    """
+    Формування звіту за журналом угод.
+    :return: Текст звіту
+    """
+    if ledger_stats is None:
+        load_ledger()
+
+    now = datetime.now()
+    with ledger_lock:
+        stats = ledger_stats
+        day = stats['daily'].get(now.strftime("%Y-%m-%d"), 0.0)
+        week = stats['weekly'].get(now.strftime("%G-W%V"), 0.0)
+        month = stats['monthly'].get(now.strftime("%Y-%m"), 0.0)
+        realized = stats['realized']
+        sells = stats['sells']
+        wins = stats['wins']
+        hold_seconds = stats['hold_seconds']
+
+    # Задіяний капітал та нереалізований прибуток за активними позиціями
+    positions = active_positions
+    deployed = sum(p.qty / qty_factor * p.price / price_factor for p in positions)
+    unrealized = sum(p.qty / qty_factor * (last_price - p.price / price_factor) for p in positions) if last_price > 0 else 0.0
+
+    message = "⚓ Статистика угод:\n"
+    message += f"Прибуток за день: {format(day, '.2f')} {quote_coin}\n"
+    message += f"Прибуток за тиждень: {format(week, '.2f')} {quote_coin}\n"
+    message += f"Прибуток за місяць: {format(month, '.2f')} {quote_coin}\n"
+    message += f"Прибуток загальний: {format(realized, '.2f')} {quote_coin}\n"
+    message += "\n"
+    message += f"Угод на продаж: {sells} (прибуткових {wins})\n"
+    message += f"Середній час утримання: {format_timedelta(timedelta(seconds=hold_seconds // sells)) if sells else 'немає'}\n"
+    message += f"Задіяний капітал: {format(deployed, '.2f')} {quote_coin}\n"
+    message += f"Нереалізований прибуток: {format(unrealized, '.2f')} {quote_coin} (по ціні {format(last_price, '.2f')})"
+
+    return message
+
 def log_stats(log_output=False, telegram_output=True):
     """
     Логування статистики.
@@ -855,13 +2692,17 @@ def log_stats(log_output=False, telegram_output=True):
     message += f"Еквіті {base_coin}: {format(equity_qty, f'.{base_precision+2}f')}\n"
     message += "\n"
 
+    # Статистика угод
+    message += format_ledger_stats() + "\n"
+    message += "\n"
+
     # Активні позиції
     if active_positions:
         message += f"✨ Активні позиції ({len(active_positions)} шт):"
         for pos in active_positions:
             message += "\n"
-            message += f"- {pos['price']} ({format(float(pos['qty']), f'.{base_precision}f')} {base_coin}"
-            message += f" / {format(float(pos['qty']) * float(pos['price']) - 0.4, '.1f')} {quote_coin})"
+            message += f"- {format_price(pos.price)} ({format_fixed(to_lots(pos.qty), base_precision)} {base_coin}"
+            message += f" / {format(pos.qty / qty_factor * pos.price / price_factor - 0.4, '.1f')} {quote_coin})"
     else:
         message += "✨ Активних позицій немає"
 
@@ -897,14 +2738,14 @@ def main():
     Головна функція для запуску бота.
     Вона ініціалізує з'єднання та підписується на стрім тікерів.
     """
-    global session, last_price
+    global session, last_price, executor
 
     log(f"⚪ Бот запущено")
 
     # Ініціалізація сесії API
     try:
         log("⛅ Підключення до біржі ", end="")
-        session = HTTP(testnet=False, demo=DEMO_MODE, api_key=API_KEY, api_secret=API_SECRET, recv_window=10000)
+        session = create_session()
         log("виконано успішно", datetime_prefix=False)
     except Exception as e:
         log(f"❌ завершено з помилкою: {e}")
@@ -913,32 +2754,77 @@ def main():
     # Отримання точності символу
     load_instruments_info()
 
+    # Побудова сітки рівнів купівлі
+    try:
+        load_grid()
+    except Exception as e:
+        log(f"❌ Помилка побудови сітки рівнів: {e}")
+        return
+
     # Отримання останньої ціни
-    last_price = float(session.get_tickers(category="spot", symbol=SYMBOL)['result']['list'][0]['lastPrice'])
+    last_price = float(rest_call(RestPriority.HISTORY, session.get_tickers, category="spot", symbol=SYMBOL)['result']['list'][0]['lastPrice'])
 
     # Завантаження поточних позицій
     load_positions()
 
+    # Завантаження статистики журналу угод
+    load_ledger()
+
+    # Завантаження тіньових сіток
+    if SHADOW_GRIDS:
+        load_shadow_grids()
+
+    # Запуск виконавця ордерів
+    executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="executor")
+    log(f"⚙️ Виконавець ордерів запущено ({EXECUTOR_WORKERS} потоків)")
+
     # Запуск робочого потоку для обробки черги повідомлень з веб-сокета
     worker_stop_event = threading.Event()
     worker_thread = threading.Thread(target=worker, args=(worker_stop_event,), daemon=True)
     worker_thread.start()
     log("⚙️ Робочий потік запущено")
 
+    feed_stop_event = threading.Event()
+    feed_thread = None
+
     while True:
         try:
-            # Ініціалізація веб-сокета для отримання тікерів
-            log("⛅ Підписка на стрім тікерів ", end="")
-            ws = WebSocket(testnet=False, channel_type="spot")
-            ws.ticker_stream(symbol=SYMBOL, callback=handle_message)
-            log("виконано успішно", datetime_prefix=False)
+            if MARKET_FEED == MarketFeed.SHARED:
+                # Читання тікерів зі спільного буфера постачальника ринкових даних
+                if feed_thread is None or not feed_thread.is_alive():
+                    feed_thread = threading.Thread(target=read_shared_feed, args=(feed_stop_event,), daemon=True)
+                    feed_thread.start()
+                    log("⚙️ Потік читання спільного буфера тіків запущено")
+            elif MARKET_FEED == MarketFeed.RAW:
+                # Читання тікерів легким клієнтом WebSocket
+                if feed_thread is None or not feed_thread.is_alive():
+                    feed_thread = threading.Thread(target=read_raw_feed, args=(feed_stop_event,), daemon=True)
+                    feed_thread.start()
+                    log("⚙️ Потік легкого клієнта WebSocket запущено")
+            else:
+                # Ініціалізація веб-сокета для отримання тікерів
+                log("⛅ Підписка на стрім тікерів ", end="")
+                ws = WebSocket(testnet=False, channel_type="spot")
+                ws.ticker_stream(symbol=SYMBOL, callback=handle_message)
+                log("виконано успішно", datetime_prefix=False)
 
             # Утримання програми в активному стані
-            while True:
+            while not trading_halted:
                 time.sleep(1)
 
+            # Торгівлю зупинено через критичні помилки
+            raise KeyboardInterrupt
+
         except KeyboardInterrupt:
-            log("⚠️ Отримано сигнал зупинки від користувача")
+            if trading_halted:
+                log("⚠️ Торгівлю зупинено через критичні помилки")
+            else:
+                log("⚠️ Отримано сигнал зупинки від користувача")
+
+            # Зупинка потоку читання тіків
+            feed_stop_event.set()
+            if feed_thread is not None:
+                feed_thread.join()
 
             while not data_queue.empty():
                 try:
@@ -948,17 +2834,32 @@ def main():
                 except queue.Empty as e:
                     log(f"❌ Помилка очищення черги: {e}")
 
-            # Зупинка робочого потоку
+            # Зупинка робочого потоку (порожнє повідомлення пробуджує потік, що очікує на черзі, коли тіки вже не надходять)
             worker_stop_event.set()
+            data_queue.put(None)
             worker_thread.join()
             while not worker_thread.is_alive():
                 log("⚙️ Робочий потік зупинено")
                 break
 
+            # Очікування завершення ордерів, що виконуються
+            log("⚙️ Очікування завершення ордерів, що виконуються...")
+            executor.shutdown(wait=True, cancel_futures=True)
+            log("⚙️ Виконавець ордерів зупинено")
+
+            # Збереження статистики журналу угод
+            flush_ledger()
+
+            # Закриття файлів трасування та запису тіків
+            flush_trace(close=True)
+            close_tick_recording()
+
             log("⚫ Бот зупинено")
             log(empty_line=True, console_output=False)
 
             # Завершення програми
+            if trading_halted:
+                sys.exit(1)
             return
 
         except Exception as e:
@@ -968,6 +2869,217 @@ def main():
             # Очікування перед перезапуском
             time.sleep(5)
 
+def report_ledger():
+    """
+    Виведення звіту за журналом угод без запуску торгівлі.
+    Файли стану лише читаються (позиції не відновлюються з API, статистика не зберігається),
+    тож звіт можна виводити під час роботи бота.
+    """
+    global session, last_price, active_positions
+
+    session = create_session()
+    load_instruments_info()
+    last_price = float(rest_call(RestPriority.HISTORY, session.get_tickers, category="spot", symbol=SYMBOL)['result']['list'][0]['lastPrice'])
+    if os.path.exists(POSITIONS_FILE):
+        try:
+            with open(POSITIONS_FILE, "r") as f:
+                active_positions = [parse_position(p) for p in json.load(f)]
+        except Exception as e:
+            log(f"❌ Помилка читання позицій з файлу: {e}", file_output=False)
+    load_ledger(save=False)
+    log(format_ledger_stats(), file_output=False)
+
+def report_execution():
+    """
+    Виведення звіту якості виконання ордерів без запуску торгівлі.
+    """
+    executions = []
+    if os.path.exists(EXECUTIONS_FILE):
+        with open(EXECUTIONS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    executions.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue # Пропускаємо пошкоджені рядки
+    log(format_execution_report(executions), file_output=False)
+
+def run_benchmark(count=100000):
+    """
+    Порівняння часу від рішення про ордер до готового до відправки запиту:
+    звичайний шлях (округлення, форматування, серіалізація та повний підпис) та підготовлений ордер.
+    Порівняння часу декодування повідомлення стріму тікерів: повний розбір JSON та легке декодування.
+    :param count: Кількість ітерацій
+    """
+    def measure(prepare):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            prepare()
+        return (time.perf_counter_ns() - start) / count / 1000
+
+    pos_qty = to_units("0.0003401400")
+
+    def regular_sell():
+        qty = format_fixed(to_lots(pos_qty), base_precision)
+        body = json.dumps({"category": "spot", "symbol": SYMBOL, "side": "Sell", "orderType": "Market", "qty": qty, "orderLinkId": "BUY_1"})
+        timestamp = str(int(time.time() * 1000))
+        signature = hmac.new(API_SECRET.encode(), (timestamp + API_KEY + str(RECV_WINDOW) + body).encode(), hashlib.sha256).hexdigest()
+        return body, {"X-BAPI-API-KEY": API_KEY, "X-BAPI-SIGN": signature, "X-BAPI-SIGN-TYPE": "2", "X-BAPI-TIMESTAMP": timestamp, "X-BAPI-RECV-WINDOW": str(RECV_WINDOW)}
+
+    armed = prepare_order("Sell", format_fixed(to_lots(pos_qty), base_precision), "BUY_1")
+
+    def armed_sell():
+        timestamp = str(int(time.time() * 1000))
+        signer = ORDER_SIGNER.copy()
+        signer.update(timestamp.encode())
+        signer.update(armed.suffix)
+        headers = dict(armed.headers)
+        headers["X-BAPI-TIMESTAMP"] = timestamp
+        headers["X-BAPI-SIGN"] = signer.hexdigest()
+        return armed.body, headers
+
+    regular = measure(regular_sell)
+    prepared = measure(armed_sell)
+    log(f"⚙️ Підготовка ордеру на продаж ({count} ітерацій): звичайний шлях {regular:.2f} мкс, підготовлений ордер {prepared:.2f} мкс", file_output=False)
+    log("⚙️ Звичайний шлях продажу додатково виконує запит балансу гаманця перед відправкою ордеру (мережева затримка не враховується)", file_output=False)
+
+    text = '{"topic":"tickers.BTCUSDT","ts":1673853746003,"type":"snapshot","cs":2588407389,"data":{"symbol":"BTCUSDT",'
+    text += '"lastPrice":"21109.77","highPrice24h":"21426.99","lowPrice24h":"20575","prevPrice24h":"20704.93","volume24h":"6780.866843",'
+    text += '"turnover24h":"141946527.22907118","price24hPcnt":"0.0196","usdIndexPrice":"21120.2400136"}}'
+
+    def regular_decode():
+        return normalize_tick(json.loads(text))
+
+    def raw_decode():
+        return decode_raw_ticker(text)
+
+    regular = measure(regular_decode)
+    raw = measure(raw_decode)
+    log(f"⚙️ Декодування повідомлення стріму тікерів ({count} ітерацій): повний розбір JSON {regular:.2f} мкс, легке декодування {raw:.2f} мкс", file_output=False)
+    log("⚙️ Обробник pybit додатково передає кожне повідомлення через власний потік та пошук обробника теми", file_output=False)
+
+def get_rss_mb():
+    """
+    Резидентна пам'ять процесу (у МБ).
+    :return: Розмір резидентної пам'яті або None, якщо недоступно (/proc є лише в Linux)
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def run_soak(args):
+    """
+    Тривала симуляція роботи без біржі: мільйони тіків через process_data з симульованим виконанням ордерів,
+    як при відтворенні тіків, з перевіркою, що пам'ять процесу не зростає. Логування під час симуляції вимкнено.
+    Угоди дописуються в тимчасовий файл історії, з якого незакриті ордери на покупку періодично відновлюються
+    потоковим читанням і звіряються з активними позиціями.
+    :param args: Необов'язкова кількість тіків та параметр --price=<початкова ціна>
+    :return: True, якщо пам'ять стабільна і відновлені позиції збігаються з активними
+    """
+    global active_positions, last_price, replay_simulation, log_muted
+
+    ticks = SOAK_TICKS
+    start_price = None
+    for arg in args:
+        if arg.startswith("--price="):
+            start_price = float(arg.split("=", 1)[1])
+        else:
+            ticks = int(arg)
+
+    try:
+        load_grid()
+    except Exception as e:
+        log(f"❌ Помилка побудови сітки рівнів: {e}", file_output=False)
+        return False
+    if SHADOW_GRIDS:
+        load_shadow_grids()
+
+    # Ціна коливається навколо рівня сітки в межах кількох кроків сітки та цілі прибутку
+    if start_price is None:
+        start_price = grid.levels[len(grid.levels) // 2] / price_factor if grid.fixed else SOAK_START_PRICE
+    center = grid.nearest(to_ticks(start_price))
+    upper = grid.shift(center, 1) if center is not None else None
+    if upper is None:
+        log(f"❌ Сітка не має рівнів навколо ціни {start_price:g}", file_output=False)
+        return False
+    band = min(max(SOAK_BAND_LEVELS * (upper - center), 2 * to_ticks(PROFIT_TARGET)), center // 2)
+    move = max((upper - center) // SOAK_LEVEL_MOVES, 1)
+    rng = random.Random(0)
+
+    log(f"⚙️ Тривала симуляція: {ticks} тіків навколо ціни {format_price(center)}{', з тіньовими сітками' if shadow_grids else ''}", file_output=False)
+
+    active_positions = []
+    last_price = 0
+    price = center
+    samples = []
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, HISTORY_FILE)
+        with open(path, "a") as history:
+            simulation = {"orders": 0, "buys": 0, "sells": 0, "realized": 0.0, "time": 0, "history": history}
+            replay_simulation = simulation
+            log_muted = True
+            try:
+                for n in range(1, ticks + 1):
+                    # Випадкове блукання ціни з поверненням до центру (обмежує кількість позицій, як еквіті в живій торгівлі)
+                    price += rng.randint(-move, move) + move * ((price < center - band) - (price > center + band))
+                    simulation['time'] = 1700000000000 + n * 100
+                    process_data((simulation['time'], price / price_factor, 0.0))
+
+                    # Періодична перевірка пам'яті та відновлення позицій з історії
+                    if n % SOAK_CHECK_TICKS == 0 or n == ticks:
+                        history.flush()
+                        buys, count, _ = read_open_buys(path)
+                        matched = {b.order_id for b in buys} == {p.order_id for p in active_positions}
+                        buys = None
+                        rss = get_rss_mb()
+                        samples.append(rss)
+
+                        log_muted = False
+                        if not matched:
+                            log(f"❌ Відновлені з історії позиції не збігаються з активними ({len(active_positions)} шт)", file_output=False)
+                            ok = False
+                        message = f"⚙️ Тіків: {n}, купівель: {simulation['buys']}, продажів: {simulation['sells']}"
+                        message += f", записів історії: {count}, позицій: {len(active_positions)}"
+                        message += f", пам'ять: {f'{rss:.1f} МБ' if rss is not None else 'невідомо'}"
+                        log(message, file_output=False)
+                        log_muted = True
+            finally:
+                log_muted = False
+                replay_simulation = None
+
+    # Базовий рівень пам'яті береться після розігріву (перша чверть перевірок)
+    samples = [s for s in samples if s is not None]
+    if len(samples) >= 2:
+        baseline = samples[len(samples) // 4]
+        growth = max(samples[len(samples) // 4:]) - baseline
+        if growth > SOAK_RSS_GROWTH_MB:
+            log(f"❌ Пам'ять зросла на {growth:.1f} МБ (допустимо {SOAK_RSS_GROWTH_MB} МБ)", file_output=False)
+            ok = False
+        else:
+            log(f"✅ Пам'ять стабільна: зростання {growth:.1f} МБ після розігріву (допустимо {SOAK_RSS_GROWTH_MB} МБ)", file_output=False)
+    else:
+        log("⚠️ Пам'ять процесу недоступна для вимірювання, перевірено лише відновлення позицій", file_output=False)
+
+    log(f"{'✅' if ok else '❌'} Тривала симуляція завершена: {ticks} тіків, купівель {simulation['buys']}, продажів {simulation['sells']}", file_output=False)
+    return ok
+
 # Точка входу
 if __name__ == "__main__":
-    main()
+    command = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    if command == "ledger":
+        report_ledger()
+    elif command == "execution":
+        report_execution()
+    elif command == "feed":
+        run_feed()
+    elif command == "replay":
+        run_replay(sys.argv[2:])
+    elif command == "bench":
+        run_benchmark()
+    elif command == "soak":
+        if not run_soak(sys.argv[2:]):
+            sys.exit(1)
+    else:
+        main()